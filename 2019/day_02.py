@@ -1,4 +1,5 @@
 from intcode import IntCode
+from intcode_symbolic import solve_noun_verb
 
 
 def part1(ic: IntCode):
@@ -10,16 +11,9 @@ def part1(ic: IntCode):
 
 
 def part2(ic: IntCode):
-    for i in range(0, 100):
-        for j in range(0, 100):
-            ic.reset()
-            ic[1] = i
-            ic[2] = j
-            ic.run()
-            if ic[0] == 19690720:
-                print(f"{i}, {j} = {ic[0]}")
-                assert i == 89 and j == 76
-                break
+    i, j = solve_noun_verb(ic.code, 19690720)
+    print(f"{i}, {j} = 19690720")
+    assert i == 89 and j == 76
 
 
 if __name__ == "__main__":
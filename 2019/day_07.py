@@ -1,35 +1,30 @@
 from itertools import permutations
-from typing import Tuple, List
+from typing import Tuple
 
 from intcode import IntCode
+from intcode_compiler import CompiledIntCode
+from intcode_network import IntCodeNetwork
 
 
 def get_thruster_signal(
     ic: IntCode, amplifier_inputs: Tuple[int, int, int, int, int], input_value: int = 0,
 ):
-    amplifiers: List[IntCode] = []
-    for i in amplifier_inputs:
-        amp = IntCode(ic.code)
-        amp.add_input(i)
-        amplifiers.append(amp)
-
-    while False in [a.halted for a in amplifiers]:
-        for amp in amplifiers:
-            amp.add_input(input_value)
-            # amp.add_input(amplifier_inputs[i], input_value)
-            amp.run(pause_on_output=True)
-            input_value = amp.output[0]
-    return input_value
+    network = IntCodeNetwork.ring([ic.fork() for _ in amplifier_inputs])
+    for i, phase in enumerate(amplifier_inputs):
+        network.send(i, phase)
+    network.send(0, input_value)
+    network.run_until_complete()
+    return network.last_output(len(amplifier_inputs) - 1)
 
 
 def part1():
     with open("day_07-input.txt", "r") as f:
-        ic = IntCode(f.read())
+        ic = CompiledIntCode(f.read())
 
     amplifiers = list(range(0, 5))
-    results = []
-    for config in permutations(amplifiers):
-        results.append((config, get_thruster_signal(ic, config)))
+    configs = list(permutations(amplifiers))
+    signals = CompiledIntCode.map_many(get_thruster_signal, ic.code, configs)
+    results = list(zip(configs, signals))
     results = sorted(results, key=lambda x: x[1], reverse=True)
     print(results[0])
     assert results[0][1] == 262086
@@ -37,12 +32,12 @@ def part1():
 
 def part2():
     with open("day_07-input.txt", "r") as f:
-        ic = IntCode(f.read())
+        ic = CompiledIntCode(f.read())
 
     feedback_amplifiers = list(range(5, 10))
-    results = []
-    for config in permutations(feedback_amplifiers):
-        results.append((config, get_thruster_signal(ic, config)))
+    configs = list(permutations(feedback_amplifiers))
+    signals = CompiledIntCode.map_many(get_thruster_signal, ic.code, configs)
+    results = list(zip(configs, signals))
     results = sorted(results, key=lambda x: x[1], reverse=True)
     print(results[0])
     assert results[0][1] == 5371621
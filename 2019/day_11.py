@@ -1,6 +1,6 @@
-from collections import defaultdict
 from enum import IntEnum
-from typing import Tuple, Dict
+from functools import partial
+from typing import Tuple, Dict, Optional
 
 from intcode import IntCode
 
@@ -12,29 +12,67 @@ class Direction(IntEnum):
     LEFT = 3
 
 
+CHUNK_BITS = 5
+CHUNK_SIZE = 1 << CHUNK_BITS
+CHUNK_MASK = CHUNK_SIZE - 1
+
+# panels are stored as colour + 1, 0 means never painted
+_RENDER_TABLE = bytes.maketrans(bytes([0, 1, 2]), b"001")
+
+
 class NumberPlate:
+    """Hull panels, held in fixed size chunks that are allocated when first painted"""
+
     def __init__(self):
-        self._plate: Dict[Tuple[int, int], int] = defaultdict(int)
+        self._chunks: Dict[Tuple[int, int], bytearray] = {}
+        self._bounds: Optional[Tuple[int, int, int, int]] = None
+        self.painted = 0
+        """Number of panels painted at least once"""
 
     def __getitem__(self, item: Tuple[int, int]):
-        return self._plate[item]
+        x, y = item
+        chunk = self._chunks.get((x >> CHUNK_BITS, y >> CHUNK_BITS))
+        if chunk is None:
+            return 0
+        value = chunk[((y & CHUNK_MASK) << CHUNK_BITS) | (x & CHUNK_MASK)]
+        return value - 1 if value else 0
 
     def __setitem__(self, key: Tuple[int, int], value: int):
-        self._plate[key] = value
+        x, y = key
+        chunk_key = x >> CHUNK_BITS, y >> CHUNK_BITS
+        chunk = self._chunks.get(chunk_key)
+        if chunk is None:
+            chunk = self._chunks[chunk_key] = bytearray(CHUNK_SIZE * CHUNK_SIZE)
+        index = ((y & CHUNK_MASK) << CHUNK_BITS) | (x & CHUNK_MASK)
+        if not chunk[index]:
+            self.painted += 1
+            self._extend_bounds(x, y)
+        chunk[index] = value + 1
+
+    def _extend_bounds(self, x: int, y: int) -> None:
+        if self._bounds is None:
+            self._bounds = x, y, x, y
+            return
+        min_x, min_y, max_x, max_y = self._bounds
+        self._bounds = min(min_x, x), min(min_y, y), max(max_x, x), max(max_y, y)
 
     def get_plate(self) -> str:
-        x_cords = [p[0] for p in self._plate.keys()]
-        y_cords = [p[1] for p in self._plate.keys()]
-        min_x = min(x_cords)
-        max_x = max(x_cords)
-        min_y = min(y_cords)
-        max_y = max(y_cords)
-        return "\n".join(
-            [
-                "".join([str(self[x, y]) for x in range(min_x, max_x + 1)])
-                for y in range(min_y, max_y + 1)
-            ]
-        )
+        if self._bounds is None:
+            return ""
+        min_x, min_y, max_x, max_y = self._bounds
+        blank = bytes(CHUNK_SIZE * CHUNK_SIZE)
+        rows = []
+        for y in range(min_y, max_y + 1):
+            row_offset = (y & CHUNK_MASK) << CHUNK_BITS
+            row = b"".join(
+                self._chunks.get((cx, y >> CHUNK_BITS), blank)[
+                    row_offset : row_offset + CHUNK_SIZE
+                ]
+                for cx in range(min_x >> CHUNK_BITS, (max_x >> CHUNK_BITS) + 1)
+            )
+            start = min_x & CHUNK_MASK
+            rows.append(row[start : start + max_x - min_x + 1])
+        return "\n".join(r.translate(_RENDER_TABLE).decode() for r in rows)
 
 
 class Robot:
@@ -69,14 +107,27 @@ class Robot:
         self._direction = Direction(new_direction)
 
     def paint(self, plate: NumberPlate) -> None:
-        while not self._brain.halted:
-            self._brain.add_input(plate[self._x, self._y])
-
-            self._brain.run(pause_on_output=True)
-            plate[self._x, self._y] = self._brain.output[0]
-
-            self._brain.run(pause_on_output=True)
-            self._turn(direction=self._brain.output[0])
+        """
+        Run the brain to completion, applying its paint/turn outputs in bulk
+        each time it asks for the camera
+        """
+        read_input = self._brain.read_input
+        self._brain.read_input = partial(self._camera, plate)
+        try:
+            self._brain.run()
+        finally:
+            self._brain.read_input = read_input
+        self._apply_outputs(plate)
+
+    def _camera(self, plate: NumberPlate) -> int:
+        self._apply_outputs(plate)
+        return plate[self._x, self._y]
+
+    def _apply_outputs(self, plate: NumberPlate) -> None:
+        output = self._brain.output
+        while len(output) >= 2:
+            plate[self._x, self._y] = output.pop()
+            self._turn(direction=output.pop())
             self._move()
 
 
@@ -0,0 +1,80 @@
+from unittest import TestCase
+
+from day_11 import NumberPlate, Robot, Direction, CHUNK_SIZE
+from intcode import IntCode
+
+
+def scripted_brain(outputs) -> IntCode:
+    """Brain that ignores the camera and outputs the given values"""
+    return IntCode(",".join([*(f"104,{value}" for value in outputs), "99"]))
+
+
+class NumberPlateTest(TestCase):
+    def test_empty(self):
+        plate = NumberPlate()
+        self.assertEqual("", plate.get_plate())
+        self.assertEqual(0, plate.painted)
+        self.assertEqual(0, plate[-5, 7])
+
+    def test_negative_coordinates(self):
+        plate = NumberPlate()
+        plate[-1, -1] = 1
+        plate[0, 0] = 0
+        plate[-CHUNK_SIZE, CHUNK_SIZE - 1] = 1
+        plate[CHUNK_SIZE, -CHUNK_SIZE - 1] = 1
+        self.assertEqual(1, plate[-1, -1])
+        self.assertEqual(0, plate[0, 0])
+        self.assertEqual(1, plate[-CHUNK_SIZE, CHUNK_SIZE - 1])
+        self.assertEqual(1, plate[CHUNK_SIZE, -CHUNK_SIZE - 1])
+        # neighbours in the same and adjacent chunks are untouched
+        self.assertEqual(0, plate[-1, 0])
+        self.assertEqual(0, plate[0, -1])
+        self.assertEqual(0, plate[CHUNK_SIZE - 1, -CHUNK_SIZE - 1])
+        self.assertEqual(4, plate.painted)
+
+    def test_repaint(self):
+        plate = NumberPlate()
+        plate[3, -4] = 1
+        plate[3, -4] = 0
+        self.assertEqual(0, plate[3, -4])
+        self.assertEqual(1, plate.painted)
+        self.assertEqual("0", plate.get_plate())
+
+    def test_get_plate_across_chunks(self):
+        plate = NumberPlate()
+        plate[-CHUNK_SIZE - 1, -2] = 1
+        plate[CHUNK_SIZE, 1] = 1
+        rows = plate.get_plate().split("\n")
+        self.assertEqual(4, len(rows))
+        self.assertEqual({2 * CHUNK_SIZE + 2}, {len(row) for row in rows})
+        self.assertEqual("1", rows[0][0])
+        self.assertEqual("1", rows[3][-1])
+        self.assertEqual(2, sum(row.count("1") for row in rows))
+
+
+class RobotTest(TestCase):
+    def test_scripted_paint(self):
+        brain = scripted_brain([1, 0, 0, 0, 1, 0, 1, 0, 0, 1, 1, 0, 1, 0])
+        plate = NumberPlate()
+        robot = Robot(brain)
+        robot.paint(plate)
+        self.assertEqual(6, plate.painted)
+        self.assertEqual("001\n001\n110", plate.get_plate())
+        self.assertEqual((0, -1, Direction.LEFT), (robot._x, robot._y, robot._direction))
+        self.assertEqual(0, len(brain.output))
+
+    def test_camera_sees_pending_paint(self):
+        # paint each panel the colour the camera sees, then turn right
+        brain = IntCode("3,100,4,100,104,1," * 3 + "99")
+        plate = NumberPlate()
+        plate[0, 0] = 1
+        Robot(brain).paint(plate)
+        self.assertEqual(3, plate.painted)
+        self.assertEqual("10\n00", plate.get_plate())
+
+    def test_halted_brain_paints_nothing(self):
+        brain = scripted_brain([])
+        plate = NumberPlate()
+        Robot(brain).paint(plate)
+        self.assertEqual(0, plate.painted)
+        self.assertEqual("", plate.get_plate())
@@ -1,11 +1,17 @@
-import curses
+import sys
 import time
 from collections import defaultdict
 from enum import IntEnum
-from functools import cached_property
-from typing import Tuple, Dict, Optional, Any
+from typing import Tuple, Dict, Optional, Callable, NamedTuple, Type
 
 from intcode import IntCode
+from intcode_compiler import CompiledIntCode
+
+try:
+    import curses
+except ImportError:
+    # only needed to play interactively
+    curses = None
 
 
 class Tile(IntEnum):
@@ -27,17 +33,115 @@ class Joystick(IntEnum):
     RIGHT = 1
 
 
+class GameResult(NamedTuple):
+    score: int
+    blocks: int
+    """Number of blocks left on the screen"""
+
+
+JoystickPolicy = Callable[["ArcadeCabinet"], Joystick]
+"""Chooses the joystick position for the next frame"""
+
+Observer = Callable[["ArcadeCabinet"], None]
+
+
+def track_ball(cabinet: "ArcadeCabinet") -> Joystick:
+    """Keep the paddle under the ball"""
+    if cabinet.ball is None or cabinet.paddle is None:
+        return Joystick.NEUTRAL
+    if cabinet.ball[0] < cabinet.paddle[0]:
+        return Joystick.LEFT
+    if cabinet.ball[0] > cabinet.paddle[0]:
+        return Joystick.RIGHT
+    return Joystick.NEUTRAL
+
+
 class ArcadeCabinet:
-    def __init__(self, program: str) -> None:
-        self._program = IntCode(program, self._read_joystick_input)
+    def __init__(self, program: str, vm: Type[IntCode] = IntCode) -> None:
+        self._program = vm(program, self._read_input)
         self._screen_buffer: Dict[Tuple[int, int], Tile] = defaultdict(
             lambda: Tile.EMPTY
         )
         self._score = 0
         self._screen = None
+        self.ball: Optional[Tuple[int, int]] = None
+        self.paddle: Optional[Tuple[int, int]] = None
+        self.frames = 0
+        self._policy: Optional[JoystickPolicy] = None
+        self._observer: Optional[Observer] = None
+        self._observe_every = 1
 
     def reset(self) -> None:
         self._program.reset()
+        self._screen_buffer.clear()
+        self._score = 0
+        self.ball = None
+        self.paddle = None
+        self.frames = 0
+
+    @property
+    def score(self) -> int:
+        return self._score
+
+    def run_headless(
+        self,
+        policy: JoystickPolicy = track_ball,
+        observer: Optional[Observer] = None,
+        observe_every: int = 1,
+    ) -> GameResult:
+        """
+        Play the game without a terminal, as fast as the VM can run it
+
+        :param policy: chooses the joystick position each frame
+        :param observer: called with the cabinet every observe_every frames, e.g. to render
+        :param observe_every: number of frames between observer calls
+        """
+        self._policy = policy
+        self._observer = observer
+        self._observe_every = observe_every
+        try:
+            outputs = self._program.iter_outputs()
+            for x, y, output in zip(outputs, outputs, outputs):
+                self._update(x, y, output)
+        finally:
+            self._policy = None
+            self._observer = None
+        return GameResult(self._score, self.get_number_of_tiles(Tile.BLOCK))
+
+    def _update(self, x: int, y: int, output: int) -> Optional[Tile]:
+        """Apply a single draw instruction, returning the tile drawn if it isn't the score"""
+        if x == -1 and y == 0:
+            self._score = output
+            return None
+
+        tile = Tile(output)
+        self._screen_buffer[x, y] = tile
+        if tile is Tile.BALL:
+            self.ball = x, y
+        elif tile is Tile.PADDLE:
+            self.paddle = x, y
+        return tile
+
+    def render(self) -> str:
+        width, height = self.dimensions
+        rows = [
+            "".join(
+                self._get_char_for_tile(self._screen_buffer[x, y], x, y)
+                for x in range(width + 1)
+            )
+            for y in range(height + 1)
+        ]
+        rows.append(f"SCORE: {self._score}")
+        return "\n".join(rows)
+
+    def _read_input(self) -> int:
+        if self._policy is None:
+            return self._read_joystick_input()
+
+        self.frames += 1
+        if self._observer is not None and self.frames % self._observe_every == 0:
+            self._observer(self)
+        return self._policy(self)
 
     @staticmethod
     def _init_colours():
@@ -57,6 +161,8 @@ class ArcadeCabinet:
         return curses.newwin(height, width, 0, 0)
 
     def run(self) -> None:
+        if curses is None:
+            raise RuntimeError("curses is not available, use run_headless()")
         curses.wrapper(self._run)
 
     def _run(self, stdscr) -> None:
@@ -64,23 +170,12 @@ class ArcadeCabinet:
         self._screen.nodelay(True)
         self._init_colours()
 
-        while not self._program.halted:
-            self._program.run(pause_on_output=True)
-            x = self._program.output[0]
-
-            self._program.run(pause_on_output=True)
-            y = self._program.output[0]
-
-            self._program.run(pause_on_output=True)
-            output = self._program.output[0]
-
-            if x == -1 and y == 0:
-                self._score = output
+        outputs = self._program.iter_outputs()
+        for x, y, output in zip(outputs, outputs, outputs):
+            tile = self._update(x, y, output)
+            if tile is None:
                 self._screen.addstr(20, 1, f"SCORE: {output}")
             else:
-                tile = Tile(output)
-                self._screen_buffer[x, y] = tile
-
                 self._screen.addch(
                     y, x, self._get_char_for_tile(tile, x, y), curses.color_pair(tile),
                 )
@@ -148,13 +243,19 @@ class ArcadeCabinet:
 
 
 def part1(cabinet: ArcadeCabinet) -> None:
-    cabinet.run()
-    number_of_blocks = cabinet.get_number_of_tiles(Tile.BLOCK)
-    print(number_of_blocks)
-    assert number_of_blocks == 270
+    result = cabinet.run_headless()
+    print(result.blocks)
+    assert result.blocks == 270
 
 
 def part2(cabinet: ArcadeCabinet) -> None:
+    cabinet.insert_quarter(2)
+    result = cabinet.run_headless()
+    print(result.score)
+    assert result.blocks == 0
+
+
+def play(cabinet: ArcadeCabinet) -> None:
     cabinet.insert_quarter(2)
     cabinet.run()
 
@@ -163,11 +264,13 @@ def main():
     with open("day_13-input.txt", "r") as f:
         program = f.read()
 
-    cabinet = ArcadeCabinet(program)
-
-    # part1(cabinet)
-    # cabinet.reset()
+    if "--play" in sys.argv:
+        play(ArcadeCabinet(program))
+        return
 
+    cabinet = ArcadeCabinet(program, CompiledIntCode)
+    part1(cabinet)
+    cabinet.reset()
     part2(cabinet)
 
 
@@ -0,0 +1,71 @@
+from unittest import TestCase
+
+from day_13 import ArcadeCabinet, GameResult, Joystick, Tile, track_ball
+from intcode import IntCode
+from intcode_compiler import CompiledIntCode
+
+FRAMES = 5
+
+
+def draw(x: int, y: int, value: int) -> str:
+    return f"104,{x},104,{y},104,{value}"
+
+
+# Draws a wall, two blocks, the paddle and the ball. Then each frame it reads
+# the joystick and outputs the sum of the positions so far as the score. At
+# the end it clears one block.
+GAME = ",".join(
+    [
+        draw(0, 0, Tile.WALL),
+        draw(1, 0, Tile.BLOCK),
+        draw(2, 0, Tile.BLOCK),
+        draw(3, 1, Tile.PADDLE),
+        draw(1, 1, Tile.BALL),
+        *["3,100,1,100,101,101,104,-1,104,0,4,101"] * FRAMES,
+        draw(2, 0, Tile.EMPTY),
+        "99",
+    ]
+)
+
+
+class ArcadeCabinetTest(TestCase):
+    def test_run_headless(self):
+        for vm in (IntCode, CompiledIntCode):
+            cabinet = ArcadeCabinet(GAME, vm)
+            result = cabinet.run_headless()
+            # the paddle is right of the ball, so tracking it always moves left
+            self.assertEqual(GameResult(-FRAMES, 1), result)
+            self.assertEqual(FRAMES, cabinet.frames)
+            self.assertEqual((1, 1), cabinet.ball)
+            self.assertEqual((3, 1), cabinet.paddle)
+
+    def test_policy(self):
+        cabinet = ArcadeCabinet(GAME)
+        seen = []
+
+        def policy(c: ArcadeCabinet) -> Joystick:
+            seen.append(c.score)
+            return Joystick.RIGHT
+
+        self.assertEqual(GameResult(FRAMES, 1), cabinet.run_headless(policy))
+        self.assertEqual(list(range(FRAMES)), seen)
+
+    def test_observe_every(self):
+        for observe_every, expected in [(1, [1, 2, 3, 4, 5]), (2, [2, 4]), (6, [])]:
+            cabinet = ArcadeCabinet(GAME)
+            frames = []
+            cabinet.run_headless(
+                observer=lambda c: frames.append(c.frames), observe_every=observe_every
+            )
+            self.assertEqual(expected, frames)
+
+    def test_reset(self):
+        cabinet = ArcadeCabinet(GAME)
+        cabinet.run_headless(track_ball)
+        cabinet.reset()
+        self.assertEqual(0, cabinet.score)
+        self.assertEqual(0, cabinet.frames)
+        self.assertIsNone(cabinet.ball)
+        self.assertIsNone(cabinet.paddle)
+        self.assertEqual(0, cabinet.get_number_of_tiles(Tile.BLOCK))
+        self.assertEqual(GameResult(-FRAMES, 1), cabinet.run_headless())
@@ -1,11 +1,35 @@
 from abc import abstractmethod, ABC
-from collections import defaultdict
+import json
+import os
+from collections import deque, Counter
+from concurrent.futures import ProcessPoolExecutor
+from copy import copy
 from dataclasses import dataclass
 from enum import IntEnum
-from typing import Optional, Dict, List, Callable
+from functools import lru_cache, partial
+from itertools import chain, islice
+from typing import (
+    Optional,
+    Dict,
+    List,
+    Callable,
+    Iterable,
+    Sequence,
+    Type,
+    Deque,
+    Iterator,
+    Tuple,
+    NamedTuple,
+    TypeVar,
+    Mapping,
+    Any,
+)
 
 SUPPRESS_OUTPUT = True
 
+T = TypeVar("T")
+R = TypeVar("R")
+
 
 class ParameterMode(IntEnum):
     POSITION = 0
@@ -19,6 +43,202 @@ class Parameter:
     mode: ParameterMode
 
 
+class MemoryBackend(ABC):
+    """Storage for the words of an IntCode program, unset addresses read as 0"""
+
+    @classmethod
+    @abstractmethod
+    def from_image(cls, image: Sequence[int]) -> "MemoryBackend":
+        pass
+
+    @abstractmethod
+    def __getitem__(self, address: int) -> int:
+        pass
+
+    @abstractmethod
+    def __setitem__(self, address: int, value: int) -> None:
+        pass
+
+    @abstractmethod
+    def values(self) -> Iterable[int]:
+        pass
+
+    @abstractmethod
+    def items(self) -> Iterable[Tuple[int, int]]:
+        """(address, value) of every address that is held in memory"""
+        pass
+
+    @abstractmethod
+    def fork(self) -> "MemoryBackend":
+        """Copy of this memory, writes to either copy are not seen by the other"""
+        pass
+
+
+class SparseMemory(dict, MemoryBackend):
+    """
+    Hash map backed memory, every address is a dict lookup
+
+    Forks share a frozen base dict, each holding the addresses it has written,
+    or read since, in its own dict. The dict methods see both.
+
+    Forking a memory that hasn't been used since it was last forked, such as
+    a template VM, copies nothing. Otherwise the whole memory is copied into a
+    new base, which is O(n). Use DenseMemory to snapshot a running VM
+    repeatedly, it only copies the pages that are written to.
+    """
+
+    def __init__(self, *args, base: Optional[Dict[int, int]] = None):
+        super().__init__(*args)
+        self._base = base
+        """Shared contents from before the last fork, never written to"""
+
+    @classmethod
+    def from_image(cls, image: Sequence[int]) -> "SparseMemory":
+        return cls(enumerate(image))
+
+    def __missing__(self, address: int) -> int:
+        value = 0 if self._base is None else self._base.get(address, 0)
+        # later reads are a plain dict lookup
+        self[address] = value
+        return value
+
+    def __contains__(self, address: int) -> bool:
+        return dict.__contains__(self, address) or (
+            self._base is not None and address in self._base
+        )
+
+    def __len__(self) -> int:
+        if self._base is None:
+            return dict.__len__(self)
+        own = sum(1 for address in dict.keys(self) if address not in self._base)
+        return len(self._base) + own
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._merged())
+
+    def get(self, address: int, default: Optional[int] = None) -> Optional[int]:
+        return self[address] if address in self else default
+
+    def keys(self) -> Iterable[int]:
+        return self._merged().keys()
+
+    def values(self) -> Iterable[int]:
+        return self._merged().values()
+
+    def items(self) -> Iterable[Tuple[int, int]]:
+        return self._merged().items()
+
+    def _merged(self) -> Dict[int, int]:
+        merged = {} if self._base is None else self._base.copy()
+        merged.update(dict.items(self))
+        return merged
+
+    def fork(self) -> "SparseMemory":
+        if dict.__len__(self) or self._base is None:
+            self._base = self._merged()
+            self.clear()
+        return type(self)(base=self._base)
+
+
+PAGE_BITS = 10
+PAGE_SIZE = 1 << PAGE_BITS
+PAGE_MASK = PAGE_SIZE - 1
+
+
+class DenseMemory(MemoryBackend):
+    """
+    Page backed memory for the program image and nearby addresses,
+    with far away addresses held in a sparse overflow dict.
+
+    Pages are shared between forks of the memory and only copied when
+    written to.
+
+    Uses a fifth of the memory of SparseMemory, but every read is a Python
+    level call, so it runs slower. Use it when holding many VMs at once.
+    """
+
+    max_gap = 1 << 16
+    """Furthest past the end of the pages a write can be before it overflows"""
+
+    def __init__(self, pages: Optional[List[Sequence[int]]] = None, size: int = 0):
+        self._pages: List[Sequence[int]] = pages if pages is not None else []
+        self._owned = bytearray(len(self._pages))
+        """Whether each page belongs only to this memory, otherwise copy on write"""
+        self._overflow: Dict[int, int] = {}
+        self._size = size
+
+    @classmethod
+    def from_image(cls, image: Sequence[int]) -> "DenseMemory":
+        image = tuple(image)
+        padding = (0,) * (-len(image) % PAGE_SIZE)
+        padded = image + padding
+        pages = [padded[i : i + PAGE_SIZE] for i in range(0, len(padded), PAGE_SIZE)]
+        return cls(pages, len(image))
+
+    def __getitem__(self, address: int) -> int:
+        if address >= 0:
+            try:
+                return self._pages[address >> PAGE_BITS][address & PAGE_MASK]
+            except IndexError:
+                pass
+        return self._overflow.get(address, 0)
+
+    def __setitem__(self, address: int, value: int) -> None:
+        page = address >> PAGE_BITS
+        if address < 0 or page >= len(self._pages) + (self.max_gap >> PAGE_BITS):
+            self._overflow[address] = value
+            return
+
+        if page >= len(self._pages):
+            self._grow(page + 1)
+        elif not self._owned[page]:
+            cells = list(self._pages[page])
+            cells.extend([0] * (PAGE_SIZE - len(cells)))
+            self._pages[page] = cells
+            self._owned[page] = True
+        self._pages[page][address & PAGE_MASK] = value
+        if address >= self._size:
+            self._size = address + 1
+
+    def _grow(self, pages: int) -> None:
+        old_end = len(self._pages) << PAGE_BITS
+        for _ in range(len(self._pages), pages):
+            self._pages.append([0] * PAGE_SIZE)
+            self._owned.append(True)
+
+        new_end = pages << PAGE_BITS
+        for address in [a for a in self._overflow if old_end <= a < new_end]:
+            self._pages[address >> PAGE_BITS][address & PAGE_MASK] = self._overflow.pop(
+                address
+            )
+            self._size = max(self._size, address + 1)
+
+    def values(self) -> Iterable[int]:
+        overflow = self._overflow
+        return chain(
+            islice(chain.from_iterable(self._pages), self._size),
+            (overflow[a] for a in sorted(overflow)),
+        )
+
+    def items(self) -> Iterable[Tuple[int, int]]:
+        return chain(
+            enumerate(islice(chain.from_iterable(self._pages), self._size)),
+            self._overflow.items(),
+        )
+
+    def fork(self) -> "DenseMemory":
+        self._owned = bytearray(len(self._pages))
+        memory = type(self)(self._pages.copy(), self._size)
+        memory._overflow = self._overflow.copy()
+        return memory
+
+
+@lru_cache(maxsize=64)
+def parse_program(code: str) -> Tuple[int, ...]:
+    """Parse the comma separated program text into its memory image"""
+    return tuple(int(i) for i in code.split(","))
+
+
 class Memory(ABC):
     ip: int
     relative_base: int
@@ -39,6 +259,11 @@ class Memory(ABC):
     def get(self, address: Parameter):
         pass
 
+    @abstractmethod
+    def is_decoded(self, address: int, operation: "Operation") -> bool:
+        """Whether operation is still the decoded instruction at address"""
+        pass
+
     @abstractmethod
     def set(self, address: Parameter, value: int):
         pass
@@ -152,7 +377,143 @@ class ChangeRelativeBase(Operation):
         return
 
 
+class ExecutionProfile:
+    """Execution counts recorded by IntCode.run while profiling is enabled"""
+
+    def __init__(self) -> None:
+        self.opcodes: Counter = Counter()
+        """Instructions executed, by operation name"""
+        self.addresses: Counter = Counter()
+        """Instructions executed, by address"""
+        self.jump_targets: Counter = Counter()
+        """Taken jumps, by target address"""
+        self.reads: Counter = Counter()
+        """Memory reads, by address"""
+        self.writes: Counter = Counter()
+        """Memory writes, by address"""
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "opcodes": dict(self.opcodes.most_common()),
+            "addresses": dict(self.addresses.most_common()),
+            "jump_targets": dict(self.jump_targets.most_common()),
+            "reads": dict(self.reads.most_common()),
+            "writes": dict(self.writes.most_common()),
+        }
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.to_dict(), **kwargs)
+
+
+class _ProfiledMemory:
+    """Wraps a memory backend while profiling, counting every read and write"""
+
+    def __init__(self, memory: MemoryBackend, profile: ExecutionProfile) -> None:
+        self.memory = memory
+        self.profile = profile
+        self._reads = profile.reads
+        self._writes = profile.writes
+
+    def __getitem__(self, address: int) -> int:
+        self._reads[address] += 1
+        return self.memory[address]
+
+    def __setitem__(self, address: int, value: int) -> None:
+        self._writes[address] += 1
+        self.memory[address] = value
+
+    def values(self) -> Iterable[int]:
+        return self.memory.values()
+
+    def items(self) -> Iterable[Tuple[int, int]]:
+        return self.memory.items()
+
+    def fork(self) -> "_ProfiledMemory":
+        """Fork of the wrapped memory, counted in the same profile"""
+        return type(self)(self.memory.fork(), self.profile)
+
+
+class FusedOperation(Operation):
+    """
+    A pair of adjacent instructions dispatched as one superinstruction
+
+    Only the first instruction's address maps to the fused operation, jumping
+    to the second instruction decodes and runs it on its own.
+    """
+
+    number_of_parameters = -1
+    """Leaves ip alone after execute, which always sets ip itself"""
+
+    def __init__(self, first: Operation, second: Operation, address: int) -> None:
+        self.first = first
+        self.second = second
+        self.address = address
+        self.second_address = address + first.number_of_parameters + 1
+        self.end = self.second_address + second.number_of_parameters + 1
+        self.parameters = {}
+
+    def execute(self, memory: Memory) -> Optional[int]:
+        self.first.execute(memory)
+        memory.ip = self.second_address
+        if not memory.is_decoded(self.address, self):
+            # the first instruction overwrote the pair, decode the second again
+            return None
+
+        ret_val = self.second.execute(memory)
+        if memory.ip == self.second_address:
+            memory.ip = self.end
+        return ret_val
+
+    def __repr__(self) -> str:
+        first, second = type(self.first).__name__, type(self.second).__name__
+        return f"{type(self).__name__}({first}, {second})"
+
+
+FUSION_PATTERNS = {
+    (LessThan, JumpIfTrue),
+    (LessThan, JumpIfFalse),
+    (Equals, JumpIfTrue),
+    (Equals, JumpIfFalse),
+    (Add, Add),
+    (Add, Multiply),
+    (Multiply, Add),
+    (Multiply, Multiply),
+    *(
+        (ChangeRelativeBase, op)
+        for op in (Add, Multiply, LessThan, Equals, JumpIfTrue, JumpIfFalse)
+    ),
+}
+"""(first, second) instruction pairs that are fused when decoded"""
+
+_FUSIBLE_FIRST = {first for first, _ in FUSION_PATTERNS}
+
+
+class IntCodeSnapshot(NamedTuple):
+    """Saved state of an IntCode VM, can be restored any number of times"""
+
+    memory: MemoryBackend
+    ip: int
+    relative_base: int
+    halted: bool
+    input: Tuple[int, ...]
+    output: Tuple[int, ...]
+    decoded: Dict[int, Operation]
+
+
+class BatchResult(NamedTuple):
+    outputs: Tuple[int, ...]
+    """Outputs in the order they were produced"""
+    memory: Tuple[int, ...]
+    """Values at the addresses requested when the run halted"""
+
+
 class IntCode(Memory):
+    fuse = False
+    """
+    Fuse common instruction pairs into superinstructions when decoding,
+    off by default as it hasn't measurably sped up any of the puzzles
+    """
+
     op_code_map = {
         1: Add,
         2: Multiply,
@@ -166,62 +527,251 @@ class IntCode(Memory):
         99: Halt,
     }
 
-    def __init__(self, code: str, input_func: Optional[Callable[[], int]] = None):
+    def __init__(
+        self,
+        code: str,
+        input_func: Optional[Callable[[], int]] = None,
+        memory: Type[MemoryBackend] = SparseMemory,
+        snapshot: Optional[IntCodeSnapshot] = None,
+    ):
         self._code = code
-        self._memory = defaultdict(int)
+        self._memory_type = memory
+        self._memory: MemoryBackend = memory()
 
+        self._input_func = input_func
         self.read_input: Callable[[], int] = input_func
         if input_func is None:
             self.read_input = self._read_input
 
         self.ip = 0
         self.relative_base = 0
-        self.output: List[int] = []
-        self.input: List[int] = []
+        self.output: Deque[int] = deque()
+        """Unread outputs, the most recent at index 0"""
+        self.input: Deque[int] = deque()
         self.halted = False
-        self.reset()
+        self._decoded: Dict[int, Operation] = {}
+        self._fused_at: Dict[int, int] = {}
+        """Address of the second instruction of each fused pair, to its first"""
+        self.profile: Optional[ExecutionProfile] = None
+        """Set to record an execution profile, runs use a slower instrumented loop"""
+        # resuming from a snapshot doesn't need the program parsed or loaded
+        if snapshot is None:
+            self.reset()
+        else:
+            self.restore(snapshot)
 
     @property
     def code(self) -> str:
         return self._code
 
     def reset(self):
-        self._memory = defaultdict(int)
-        instructions = self._code.split(",")
-        for i in range(0, len(instructions)):
-            self[i] = int(instructions[i])
+        self._memory = self._memory_type.from_image(parse_program(self._code))
+        self._clear_caches()
         self.ip = 0
         self.relative_base = 0
-        self.output = []
+        self.output = deque()
         self.halted = False
 
-    def run(self, pause_on_output=False):
-        while not self.halted:
-            prev_ip = self.ip
-            operation = self._parse_opcode(self[self.ip])
-            try:
-                ret_val = operation.execute(self)
+    def _clear_caches(self) -> None:
+        """Drop everything derived from the contents of memory"""
+        self._decoded = {}
+        self._fused_at = {}
+
+    def snapshot(self) -> IntCodeSnapshot:
+        """Save the current state, memory is shared with the VM until written"""
+        memory = self._memory.fork()
+        if isinstance(memory, _ProfiledMemory):
+            # the profile belongs to the run, not to the saved state
+            memory = memory.memory
+        return IntCodeSnapshot(
+            memory,
+            self.ip,
+            self.relative_base,
+            self.halted,
+            tuple(self.input),
+            tuple(self.output),
+            self._decoded.copy(),
+        )
+
+    def restore(self, snapshot: IntCodeSnapshot) -> None:
+        self._clear_caches()
+        memory = snapshot.memory.fork()
+        if isinstance(self._memory, _ProfiledMemory):
+            memory = _ProfiledMemory(memory, self._memory.profile)
+        self._memory = memory
+        self._decoded = snapshot.decoded.copy()
+        self._fused_at = {
+            operation.second_address: address
+            for address, operation in self._decoded.items()
+            if isinstance(operation, FusedOperation)
+        }
+        self.ip = snapshot.ip
+        self.relative_base = snapshot.relative_base
+        self.halted = snapshot.halted
+        self.input = deque(snapshot.input)
+        self.output = deque(snapshot.output)
+
+    def fork(self) -> "IntCode":
+        """Independent copy of this VM, memory is shared until either VM writes to it"""
+        vm = copy(self)
+        vm.restore(self.snapshot())
+        if self._input_func is None:
+            vm.read_input = vm._read_input
+        return vm
+
+    @classmethod
+    def map_many(
+        cls,
+        func: Callable[["IntCode", T], R],
+        program: str,
+        args: Iterable[T],
+        workers: Optional[int] = None,
+        memory: Type[MemoryBackend] = SparseMemory,
+    ) -> List[R]:
+        """
+        Call func(vm, arg) for each arg across a pool of processes,
+        where vm is a fresh VM loaded with program.
+
+        Each worker parses the program once and forks a VM per call, func
+        must be picklable. Results are returned in the same order as args.
+        """
+        args = list(args)
+        workers = workers or os.cpu_count() or 1
+        if workers == 1 or len(args) <= 1:
+            template = cls(program, memory=memory)
+            return [func(template.fork(), arg) for arg in args]
+
+        chunk_size = max(1, len(args) // (workers * 4))
+        with ProcessPoolExecutor(
+            workers, initializer=_init_worker, initargs=(cls, program, memory)
+        ) as pool:
+            return list(
+                pool.map(partial(_call_worker, func), args, chunksize=chunk_size)
+            )
+
+    @classmethod
+    def run_many(
+        cls,
+        program: str,
+        input_sets: Iterable[Sequence[int]],
+        workers: Optional[int] = None,
+        patches: Optional[Iterable[Mapping[int, int]]] = None,
+        read: Sequence[int] = (),
+        memory: Type[MemoryBackend] = SparseMemory,
+    ) -> List[BatchResult]:
+        """
+        Run program to completion once per input set across a pool of processes
+
+        :param program: program source
+        :param input_sets: input values for each run
+        :param workers: number of processes, defaults to the number of CPUs
+        :param patches: memory writes to make before each run, paired with input_sets
+        :param read: addresses to read back from memory after each run
+        :param memory: memory backend to load program into
+        """
+        input_sets = list(input_sets)
+        if patches is None:
+            patches = [{}] * len(input_sets)
+        jobs = [
+            (tuple(inputs), dict(patch), tuple(read))
+            for inputs, patch in zip(input_sets, patches)
+        ]
+        return cls.map_many(_run_job, program, jobs, workers, memory)
+
+    def run(self, pause_on_output=False, pause_on_input=False):
+        if self.profile is not None:
+            self._run_profiled(pause_on_output, pause_on_input)
+            return
 
-            except HaltException:
-                self.halted = True
+        while not self.halted:
+            if pause_on_input and self.waiting_for_input:
                 break
-
-            if self.ip == prev_ip:
-                self.ip += operation.number_of_parameters + 1
-
+            ret_val = self.step()
             if ret_val is None:
                 continue
 
-            self.output.insert(0, ret_val)
+            self.output.appendleft(ret_val)
             if pause_on_output:
                 break
 
+    def _run_profiled(self, pause_on_output=False, pause_on_input=False):
+        profile = self.profile
+        self._memory = _ProfiledMemory(self._memory, profile)
+        # profile individual instructions, they aren't fused while profiling
+        for address in self._fused_at.values():
+            self._decoded.pop(address, None)
+        self._fused_at = {}
+        try:
+            while not self.halted:
+                if pause_on_input and self.waiting_for_input:
+                    break
+                ip = self.ip
+                operation = self._decoded.get(ip)
+                if operation is None:
+                    operation = self._decode(ip)
+                profile.opcodes[type(operation).__name__] += 1
+                profile.addresses[ip] += 1
+
+                ret_val = self.step()
+                next_ip = ip + operation.number_of_parameters + 1
+                if not self.halted and self.ip != next_ip:
+                    profile.jump_targets[self.ip] += 1
+                if ret_val is None:
+                    continue
+
+                self.output.appendleft(ret_val)
+                if pause_on_output:
+                    break
+        finally:
+            # the program may have been reset while running
+            if isinstance(self._memory, _ProfiledMemory):
+                self._memory = self._memory.memory
+
+    @property
+    def waiting_for_input(self) -> bool:
+        """Whether the next instruction reads input and none is queued"""
+        if self.input or self.halted:
+            return False
+        operation = self._decoded.get(self.ip)
+        if operation is None:
+            operation = self._decode(self.ip)
+        return isinstance(operation, Input)
+
+    def step(self) -> Optional[int]:
+        """Execute the instruction at ip, returning its output value if it has one"""
+        prev_ip = self.ip
+        operation = self._decoded.get(prev_ip)
+        if operation is None:
+            operation = self._decode(prev_ip)
+        try:
+            ret_val = operation.execute(self)
+        except HaltException:
+            self.halted = True
+            return None
+
+        if self.ip == prev_ip:
+            self.ip += operation.number_of_parameters + 1
+        return ret_val
+
+    def iter_outputs(self) -> Iterator[int]:
+        """Run the program, yielding (and consuming) outputs in the order they're produced"""
+        while self.output:
+            yield self.output.pop()
+        while not self.halted:
+            self.run(pause_on_output=True)
+            while self.output:
+                yield self.output.pop()
+
+    def run_until_output(self, count: int = 1) -> List[int]:
+        """Run until the next count outputs have been produced, fewer if the program halts"""
+        return list(islice(self.iter_outputs(), count))
+
     def read_input(self) -> int:
         return self._read_input()
 
     def _read_input(self) -> int:
         if self.input:
-            input_value = self.input.pop(0)
+            input_value = self.input.popleft()
             if not SUPPRESS_OUTPUT:
                 print(f"<<< {input_value}")
             return input_value
@@ -229,7 +779,33 @@ class IntCode(Memory):
             return int(input("<<< "))
 
     def add_input(self, *values: int):
-        self.input += values
+        self.input.extend(values)
+
+    def _decode(self, address: int) -> Operation:
+        """Decode the instruction at address and cache it until address is written"""
+        operation = self._parse_opcode(self[address])
+        if self.fuse and self.profile is None and type(operation) in _FUSIBLE_FIRST:
+            operation = self._fuse(operation, address)
+        self._decoded[address] = operation
+        return operation
+
+    def is_decoded(self, address: int, operation: Operation) -> bool:
+        return self._decoded.get(address) is operation
+
+    def _fuse(self, first: Operation, address: int) -> Operation:
+        """Fuse first with the instruction following it, if they're a known pattern"""
+        second_address = address + first.number_of_parameters + 1
+        if self._fused_at.get(second_address, address) != address:
+            return first
+        try:
+            second = self._parse_opcode(self[second_address])
+        except (KeyError, ValueError):
+            # not an instruction, e.g. data after a jump
+            return first
+        if (type(first), type(second)) not in FUSION_PATTERNS:
+            return first
+        self._fused_at[second_address] = address
+        return FusedOperation(first, second, address)
 
     def _parse_opcode(self, op: int) -> Operation:
         instruction_code = f"{op:05}"
@@ -247,20 +823,49 @@ class IntCode(Memory):
 
     def __setitem__(self, key, value):
         self._memory[key] = value
+        if key in self._decoded:
+            del self._decoded[key]
+        if key in self._fused_at:
+            self._decoded.pop(self._fused_at.pop(key), None)
 
     def _get_address(self, address: Parameter):
         if address.mode == ParameterMode.RELATIVE:
-            offset = self[self.ip + 1 + address.position]
+            offset = self._memory[self.ip + 1 + address.position]
             return self.relative_base + offset
 
         address_ptr = self.ip + 1 + address.position
         if address.mode == ParameterMode.POSITION:
-            return self[address_ptr]
+            return self._memory[address_ptr]
 
         return address_ptr
 
     def get(self, address: Parameter) -> int:
-        return self[self._get_address(address)]
+        return self._memory[self._get_address(address)]
 
     def set(self, address: Parameter, value: int):
         self[self._get_address(address)] = value
+
+
+_WORKER_VM: Optional[IntCode] = None
+
+
+def _init_worker(
+    vm_type: Type[IntCode], program: str, memory: Type[MemoryBackend]
+) -> None:
+    global _WORKER_VM
+    _WORKER_VM = vm_type(program, memory=memory)
+
+
+def _call_worker(func: Callable[[IntCode, T], R], arg: T) -> R:
+    return func(_WORKER_VM.fork(), arg)
+
+
+def _run_job(
+    vm: IntCode, job: Tuple[Tuple[int, ...], Dict[int, int], Tuple[int, ...]]
+) -> BatchResult:
+    inputs, patch, read = job
+    for address, value in patch.items():
+        vm[address] = value
+    vm.add_input(*inputs)
+    vm.run()
+    return BatchResult(tuple(reversed(vm.output)), tuple(vm[a] for a in read))
@@ -0,0 +1,232 @@
+"""
+IntCode benchmark and regression check
+
+Runs every 2019 IntCode workload with fixed inputs, reporting instructions
+executed, wall clock time and instructions per second. Results are appended
+to a history file, and the run fails if a workload is slower than the median
+of its recent history by more than the threshold.
+
+    python intcode_bench.py --engine compiled --repeat 5
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from dataclasses import dataclass, asdict
+from itertools import permutations
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Type
+
+from intcode import IntCode, ExecutionProfile
+from intcode_compiler import CompiledIntCode
+
+ROOT = Path(__file__).parent
+DEFAULT_HISTORY = ROOT / "intcode_bench-history.jsonl"
+
+ENGINES: Dict[str, Type[IntCode]] = {
+    "interpreter": IntCode,
+    "compiled": CompiledIntCode,
+}
+
+Workload = Callable[[Type[IntCode]], None]
+
+
+def _program(day: int) -> str:
+    return ROOT.joinpath(f"day_{day:02}-input.txt").read_text()
+
+
+def day_02(vm_type: Type[IntCode]) -> None:
+    template = vm_type(_program(2))
+    for noun in range(100):
+        for verb in range(100):
+            vm = template.fork()
+            vm[1] = noun
+            vm[2] = verb
+            vm.run()
+            if vm[0] == 19690720:
+                return
+    raise AssertionError("day 02 noun/verb not found")
+
+
+def day_05(vm_type: Type[IntCode]) -> None:
+    for system_id, expected in ((1, 5346030), (5, 513116)):
+        vm = vm_type(_program(5))
+        vm.add_input(system_id)
+        vm.run()
+        assert vm.output[0] == expected
+
+
+def day_07(vm_type: Type[IntCode]) -> None:
+    from day_07 import get_thruster_signal
+
+    template = vm_type(_program(7))
+    for phases, expected in ((range(0, 5), 262086), (range(5, 10), 5371621)):
+        best = max(get_thruster_signal(template, p) for p in permutations(phases))
+        assert best == expected
+
+
+def day_09(vm_type: Type[IntCode]) -> None:
+    for mode, expected in ((1, 3241900951), (2, 83089)):
+        vm = vm_type(_program(9))
+        vm.add_input(mode)
+        vm.run()
+        assert vm.output[0] == expected
+
+
+def day_11(vm_type: Type[IntCode]) -> None:
+    from day_11 import NumberPlate, Robot
+
+    plate = NumberPlate()
+    plate[0, 0] = 1
+    Robot(vm_type(_program(11))).paint(plate)
+
+
+def day_13(vm_type: Type[IntCode]) -> None:
+    from day_13 import ArcadeCabinet
+
+    cabinet = ArcadeCabinet(_program(13), vm_type)
+    cabinet.insert_quarter(2)
+    result = cabinet.run_headless()
+    assert result.blocks == 0
+
+
+WORKLOADS: Dict[str, Workload] = {
+    "day_02": day_02,
+    "day_05": day_05,
+    "day_07": day_07,
+    "day_09": day_09,
+    "day_11": day_11,
+    "day_13": day_13,
+}
+
+
+@dataclass
+class BenchResult:
+    workload: str
+    instructions: int
+    best: float
+    """Fastest run / s"""
+    mean: float
+    """Mean of all runs / s"""
+
+    @property
+    def ops_per_second(self) -> float:
+        return self.instructions / self.best
+
+
+def _profiled(vm_type: Type[IntCode], profile: ExecutionProfile) -> Type[IntCode]:
+    class ProfiledVM(vm_type):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.profile = profile
+
+    return ProfiledVM
+
+
+def count_instructions(workload: Workload, vm_type: Type[IntCode]) -> int:
+    """Instructions executed by a workload, from a separate profiled run"""
+    profile = ExecutionProfile()
+    workload(_profiled(vm_type, profile))
+    return sum(profile.opcodes.values())
+
+
+def bench(name: str, vm_type: Type[IntCode], repeat: int) -> BenchResult:
+    workload = WORKLOADS[name]
+    instructions = count_instructions(workload, vm_type)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        workload(vm_type)
+        timings.append(time.perf_counter() - start)
+    return BenchResult(name, instructions, min(timings), statistics.mean(timings))
+
+
+def load_history(path: Path) -> List[dict]:
+    if not path.exists():
+        return []
+    with path.open("r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def find_regressions(
+    results: List[BenchResult],
+    history: List[dict],
+    engine: str,
+    threshold: float,
+    window: int = 5,
+) -> List[str]:
+    """Workloads slower than the median of their last window runs by more than threshold"""
+    regressions = []
+    for result in results:
+        previous = [
+            entry["results"][result.workload]["best"]
+            for entry in history
+            if entry["engine"] == engine and result.workload in entry["results"]
+        ][-window:]
+        if not previous:
+            continue
+        baseline = statistics.median(previous)
+        if result.best > baseline * (1 + threshold):
+            regressions.append(
+                f"{result.workload}: {result.best:.3f}s vs baseline {baseline:.3f}s"
+            )
+    return regressions
+
+
+def record(path: Path, engine: str, results: List[BenchResult]) -> None:
+    entry = {
+        "timestamp": time.time(),
+        "engine": engine,
+        "python": sys.version.split()[0],
+        "results": {r.workload: asdict(r) for r in results},
+    }
+    with path.open("a") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="interpreter")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--workload", action="append", choices=sorted(WORKLOADS), dest="workloads"
+    )
+    parser.add_argument("--history", type=Path, default=DEFAULT_HISTORY)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="allowed slowdown against history before failing, as a fraction",
+    )
+    parser.add_argument(
+        "--no-record", action="store_true", help="don't add results to the history"
+    )
+    args = parser.parse_args(argv)
+
+    vm_type = ENGINES[args.engine]
+    results = []
+    print(
+        f"{'workload':<8} {'instructions':>12} {'best (s)':>9} "
+        f"{'mean (s)':>9} {'ops/s':>11}"
+    )
+    for name in args.workloads or WORKLOADS:
+        result = bench(name, vm_type, args.repeat)
+        results.append(result)
+        print(
+            f"{name:<8} {result.instructions:>12} {result.best:>9.3f} "
+            f"{result.mean:>9.3f} {result.ops_per_second:>11,.0f}"
+        )
+
+    regressions = find_regressions(
+        results, load_history(args.history), args.engine, args.threshold
+    )
+    if not args.no_record:
+        record(args.history, args.engine, results)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,40 @@
+from unittest import TestCase
+
+from intcode import IntCode
+from intcode_bench import BenchResult, find_regressions, count_instructions
+
+
+def _entry(engine: str, **bests: float) -> dict:
+    return {
+        "engine": engine,
+        "results": {name: {"best": best} for name, best in bests.items()},
+    }
+
+
+class IntCodeBenchTest(TestCase):
+    def test_count_instructions(self):
+        def workload(vm_type):
+            vm = vm_type("1101,0,3,12,1001,12,-1,12,1005,12,4,99,0")
+            vm.fork().run()
+
+        self.assertEqual(8, count_instructions(workload, IntCode))
+
+    def test_find_regressions(self):
+        history = [
+            _entry("interpreter", day_09=1.0),
+            _entry("interpreter", day_09=1.2),
+            _entry("interpreter", day_09=1.1),
+            _entry("compiled", day_09=0.1),
+        ]
+        results = [BenchResult("day_09", 100, 1.25, 1.3)]
+        self.assertEqual([], find_regressions(results, history, "interpreter", 0.2))
+
+        results = [BenchResult("day_09", 100, 1.4, 1.5)]
+        regressions = find_regressions(results, history, "interpreter", 0.2)
+        self.assertEqual(1, len(regressions))
+        regressions = find_regressions(results, history, "compiled", 0.2)
+        self.assertEqual(1, len(regressions))
+
+    def test_no_history(self):
+        results = [BenchResult("day_05", 100, 1.0, 1.0)]
+        self.assertEqual([], find_regressions(results, [], "interpreter", 0.2))
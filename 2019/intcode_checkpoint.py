@@ -0,0 +1,260 @@
+"""
+Binary checkpoints of IntCode VM state
+
+A checkpoint holds the program source, memory, ip, relative base, halted flag,
+pending input and unread output, so a long running VM can be resumed later.
+
+Layout (little endian, sections aligned to 8 bytes):
+
+    header      see _HEADER
+    code        program source, utf-8
+    image       int64 words for addresses 0..image_length
+    sparse      int64 (address, value) pairs for addresses outside the image
+    input       int64 pending input, oldest first
+    output      int64 unread output, oldest first
+    bigints     (section, index, length) + signed bytes for values that don't fit in int64
+
+With use_mmap, DenseMemory pages are views over the mapped image section and
+are only copied into memory when written to.
+"""
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Type, Union
+
+from intcode import (
+    IntCode,
+    IntCodeSnapshot,
+    MemoryBackend,
+    SparseMemory,
+    DenseMemory,
+    PAGE_SIZE,
+)
+
+MAGIC = b"ICKP"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sHBBqqQQQQQQ")
+"""magic, version, memory type, halted, ip, relative base, code length,
+image length, sparse pairs, input length, output length, bigints"""
+
+_BIGINT = struct.Struct("<BQI")
+
+IMAGE_LIMIT = 1 << 20
+"""Addresses at or past this are stored as sparse pairs"""
+
+_MEMORY_TYPES: Dict[int, Type[MemoryBackend]] = {0: SparseMemory, 1: DenseMemory}
+_MEMORY_TYPE_IDS = {v: k for k, v in _MEMORY_TYPES.items()}
+
+_IMAGE, _SPARSE, _INPUT, _OUTPUT = range(4)
+_INT64_MIN, _INT64_MAX = -(1 << 63), (1 << 63) - 1
+
+PathLike = Union[str, Path]
+
+
+class CheckpointError(ValueError):
+    pass
+
+
+def _padding(length: int) -> bytes:
+    return b"\0" * (-length % 8)
+
+
+def _pack(
+    section: int, values: Iterable[int], bigints: List[Tuple[int, int, int]]
+) -> array:
+    """Pack values as int64, recording any that don't fit in bigints"""
+    packed = array("q")
+    for i, value in enumerate(values):
+        if _INT64_MIN <= value <= _INT64_MAX:
+            packed.append(value)
+        else:
+            packed.append(0)
+            bigints.append((section, i, value))
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return packed
+
+
+def save(vm: IntCode, path: PathLike) -> None:
+    """Write the full state of vm to path"""
+    memory = vm._memory
+    image: Dict[int, int] = {}
+    sparse: Dict[int, int] = {}
+    for address, value in memory.items():
+        if 0 <= address < IMAGE_LIMIT:
+            image[address] = value
+        else:
+            sparse[address] = value
+    image_length = max(image, default=-1) + 1
+
+    bigints: List[Tuple[int, int, int]] = []
+    sections = [
+        _pack(_IMAGE, (image.get(a, 0) for a in range(image_length)), bigints),
+        _pack(_SPARSE, (v for pair in sorted(sparse.items()) for v in pair), bigints),
+        _pack(_INPUT, vm.input, bigints),
+        _pack(_OUTPUT, reversed(vm.output), bigints),
+    ]
+    code = vm.code.encode("utf-8")
+    memory_type = _MEMORY_TYPE_IDS.get(type(memory), 0)
+
+    with Path(path).open("wb") as f:
+        f.write(
+            _HEADER.pack(
+                MAGIC,
+                VERSION,
+                memory_type,
+                vm.halted,
+                vm.ip,
+                vm.relative_base,
+                len(code),
+                image_length,
+                len(sparse),
+                len(vm.input),
+                len(vm.output),
+                len(bigints),
+            )
+        )
+        f.write(_padding(_HEADER.size))
+        f.write(code)
+        f.write(_padding(len(code)))
+        for section in sections:
+            f.write(section.tobytes())
+        for section, index, value in bigints:
+            data = value.to_bytes((value.bit_length() + 8) // 8, "little", signed=True)
+            f.write(_BIGINT.pack(section, index, len(data)))
+            f.write(data)
+
+
+def load(
+    path: PathLike,
+    vm_type: Type[IntCode] = IntCode,
+    input_func: Optional[Callable[[], int]] = None,
+    use_mmap: bool = False,
+) -> IntCode:
+    """
+    Load a VM from a checkpoint written by save
+
+    :param path: checkpoint file
+    :param vm_type: VM class to construct
+    :param input_func: passed to the VM constructor
+    :param use_mmap: map the file rather than reading it, memory pages are loaded on write
+    """
+    with Path(path).open("rb") as f:
+        # an empty file can't be mapped, read it to report it as truncated
+        if use_mmap and os.fstat(f.fileno()).st_size > 0:
+            data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        else:
+            data = memoryview(f.read())
+
+    if len(data) < _HEADER.size:
+        raise CheckpointError("checkpoint is truncated")
+    (
+        magic,
+        version,
+        memory_type,
+        halted,
+        ip,
+        relative_base,
+        code_length,
+        image_length,
+        sparse_length,
+        input_length,
+        output_length,
+        bigint_length,
+    ) = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise CheckpointError("not an IntCode checkpoint")
+    if version != VERSION:
+        raise CheckpointError("unsupported checkpoint version", version)
+    if memory_type not in _MEMORY_TYPES:
+        raise CheckpointError("unknown memory type", memory_type)
+
+    offset = _HEADER.size + len(_padding(_HEADER.size))
+    if len(data) - offset < code_length:
+        raise CheckpointError("checkpoint is truncated")
+    code = bytes(data[offset : offset + code_length]).decode("utf-8")
+    offset += code_length + len(_padding(code_length))
+
+    def section(length: int) -> memoryview:
+        nonlocal offset
+        view = data[offset : offset + length * 8]
+        offset += length * 8
+        if len(view) != length * 8:
+            raise CheckpointError("checkpoint is truncated")
+        if sys.byteorder != "little":
+            swapped = array("q", view.tobytes())
+            swapped.byteswap()
+            return memoryview(swapped)
+        return view.cast("q")
+
+    sections = [
+        section(image_length),
+        section(sparse_length * 2),
+        section(input_length),
+        section(output_length),
+    ]
+    bigints: List[Tuple[int, int, int]] = []
+    for _ in range(bigint_length):
+        if len(data) - offset < _BIGINT.size:
+            raise CheckpointError("checkpoint is truncated")
+        index_section, index, length = _BIGINT.unpack_from(data, offset)
+        offset += _BIGINT.size
+        if len(data) - offset < length:
+            raise CheckpointError("checkpoint is truncated")
+        value = int.from_bytes(data[offset : offset + length], "little", signed=True)
+        offset += length
+        if index_section > _OUTPUT or index >= len(sections[index_section]):
+            raise CheckpointError("big integer outside its section", index)
+        bigints.append((index_section, index, value))
+    if offset != len(data):
+        raise CheckpointError("unexpected data after checkpoint")
+
+    image, sparse, inputs, outputs = sections
+    sparse = list(sparse)
+    inputs = list(inputs)
+    outputs = list(outputs)
+    image_patches: Dict[int, int] = {}
+    for index_section, index, value in bigints:
+        if index_section == _IMAGE:
+            image_patches[index] = value
+        elif index_section == _SPARSE:
+            sparse[index] = value
+        elif index_section == _INPUT:
+            inputs[index] = value
+        else:
+            outputs[index] = value
+
+    memory_cls = _MEMORY_TYPES[memory_type]
+    if memory_cls is SparseMemory:
+        # held as the base of the memory, so restoring it doesn't copy it
+        contents = dict(enumerate(image.tolist()))
+        contents.update(image_patches)
+        contents.update(zip(sparse[::2], sparse[1::2]))
+        memory = SparseMemory(base=contents)
+    else:
+        if use_mmap:
+            pages = [
+                image[i : i + PAGE_SIZE] for i in range(0, image_length, PAGE_SIZE)
+            ]
+            memory = DenseMemory(pages, image_length)
+        else:
+            memory = DenseMemory.from_image(image.tolist())
+        for address, value in image_patches.items():
+            memory[address] = value
+        for i in range(0, len(sparse), 2):
+            memory[sparse[i]] = sparse[i + 1]
+
+    snapshot = IntCodeSnapshot(
+        memory,
+        ip,
+        relative_base,
+        bool(halted),
+        tuple(inputs),
+        tuple(reversed(outputs)),
+        {},
+    )
+    return vm_type(code, input_func, memory=memory_cls, snapshot=snapshot)
@@ -0,0 +1,112 @@
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+import intcode_checkpoint
+from intcode import IntCode, DenseMemory
+from intcode_checkpoint import CheckpointError
+from intcode_compiler import CompiledIntCode
+
+QUINE = "109,1,204,-1,1001,100,1,100,1008,100,16,101,1006,101,0,99"
+
+
+class IntCodeCheckpointTest(TestCase):
+    def setUp(self) -> None:
+        self._dir = tempfile.TemporaryDirectory()
+        self.path = Path(self._dir.name, "vm.ickp")
+
+    def tearDown(self) -> None:
+        self._dir.cleanup()
+
+    def test_resume(self):
+        for memory in (None, DenseMemory):
+            for use_mmap in (False, True):
+                kwargs = {"memory": memory} if memory else {}
+                ic = IntCode(QUINE, **kwargs)
+                ic.run_until_output(5)
+                ic.run(pause_on_output=True)
+                ic.add_input(7, 8)
+                intcode_checkpoint.save(ic, self.path)
+
+                restored = intcode_checkpoint.load(self.path, use_mmap=use_mmap)
+                self.assertIsInstance(restored._memory, memory or dict)
+                self.assertEqual(ic.ip, restored.ip)
+                self.assertEqual(ic.relative_base, restored.relative_base)
+                self.assertEqual([7, 8], list(restored.input))
+                self.assertEqual([100], list(restored.output))
+                self.assertEqual(
+                    QUINE.split(",")[5:], [str(i) for i in restored.iter_outputs()]
+                )
+                self.assertEqual(
+                    list(ic._memory.values())[:16], list(restored._memory.values())[:16]
+                )
+
+    def test_load_does_not_parse_program(self):
+        for memory in (None, DenseMemory):
+            kwargs = {"memory": memory} if memory else {}
+            ic = IntCode(QUINE, **kwargs)
+            ic.run_until_output(3)
+            intcode_checkpoint.save(ic, self.path)
+            with patch("intcode.parse_program", side_effect=AssertionError):
+                restored = intcode_checkpoint.load(self.path, CompiledIntCode)
+            self.assertEqual(
+                QUINE.split(",")[3:], [str(i) for i in restored.iter_outputs()]
+            )
+
+    def test_bigints_and_sparse_addresses(self):
+        ic = IntCode("99")
+        ic[1] = 1 << 80
+        ic[1 << 40] = -(1 << 70)
+        ic.add_input(1 << 64)
+        ic.output.appendleft(-(1 << 63) - 1)
+        intcode_checkpoint.save(ic, self.path)
+
+        restored = intcode_checkpoint.load(self.path, CompiledIntCode)
+        self.assertIsInstance(restored, CompiledIntCode)
+        self.assertEqual(1 << 80, restored[1])
+        self.assertEqual(-(1 << 70), restored[1 << 40])
+        self.assertEqual([1 << 64], list(restored.input))
+        self.assertEqual([-(1 << 63) - 1], list(restored.output))
+
+    def test_mmap_pages_copied_on_write(self):
+        ic = IntCode(",".join(["0"] * 3000 + ["99"]), memory=DenseMemory)
+        ic[2500] = 5
+        intcode_checkpoint.save(ic, self.path)
+
+        restored = intcode_checkpoint.load(self.path, use_mmap=True)
+        self.assertIsInstance(restored._memory._pages[0], memoryview)
+        restored[10] = 1
+        self.assertEqual(1, restored[10])
+        self.assertEqual(5, restored[2500])
+        self.assertIsInstance(restored._memory._pages[0], list)
+        self.assertIsInstance(restored._memory._pages[2], memoryview)
+
+    def test_not_a_checkpoint(self):
+        self.path.write_bytes(b"1,2,3,4" * 20)
+        with self.assertRaises(CheckpointError):
+            intcode_checkpoint.load(self.path)
+
+    def test_truncated(self):
+        ic = IntCode("99")
+        ic[1] = 123456789012345678901234567890
+        intcode_checkpoint.save(ic, self.path)
+        data = self.path.read_bytes()
+        # cut into the big integer value, its (section, index, length) header,
+        # the int64 image and the header itself
+        for cut in (3, 20, 40, len(data) - 10):
+            self.path.write_bytes(data[:-cut])
+            with self.assertRaises(CheckpointError, msg=f"cut {cut}"):
+                intcode_checkpoint.load(self.path)
+
+    def test_trailing_bytes(self):
+        intcode_checkpoint.save(IntCode("99"), self.path)
+        self.path.write_bytes(self.path.read_bytes() + b"\0")
+        with self.assertRaises(CheckpointError):
+            intcode_checkpoint.load(self.path)
+
+    def test_empty_file(self):
+        self.path.write_bytes(b"")
+        for use_mmap in (False, True):
+            with self.assertRaises(CheckpointError):
+                intcode_checkpoint.load(self.path, use_mmap=use_mmap)
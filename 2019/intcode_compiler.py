@@ -0,0 +1,223 @@
+"""
+Ahead-of-time compilation of IntCode basic blocks into Python functions
+
+A basic block is a run of arithmetic/compare/relative base instructions,
+ending at (and including) a jump or halt. Input and output instructions end
+a block before them and are executed by the interpreter. Operand modes and
+immediate values are baked into the generated source as constants.
+
+Blocks are only compiled once their start address has been reached
+compile_threshold times, so code that runs once (e.g. straight line programs
+run with many different inputs) doesn't pay for compilation.
+
+If the program writes into the code region of a compiled block, the block is
+discarded and execution from that address falls back to the interpreter.
+"""
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Callable, Type
+
+from intcode import (
+    IntCode,
+    IntCodeSnapshot,
+    ParameterMode,
+    MemoryBackend,
+    SparseMemory,
+)
+
+Block = Callable[[IntCode, MemoryBackend], None]
+
+MAX_BLOCK_INSTRUCTIONS = 64
+
+_STRAIGHT_LINE = {1: "+", 2: "*", 7: "<", 8: "=="}
+_PARAMETER_COUNTS = {1: 3, 2: 3, 3: 1, 4: 1, 5: 2, 6: 2, 7: 3, 8: 3, 9: 1, 99: 0}
+
+
+def _decode(op: int) -> Tuple[int, List[ParameterMode]]:
+    instruction = op % 100
+    modes = [ParameterMode((op // 10 ** (i + 2)) % 10) for i in range(3)]
+    return instruction, modes
+
+
+def _is_valid(op: int) -> bool:
+    if op < 0 or op % 100 not in _PARAMETER_COUNTS:
+        return False
+    return all(d in "012" for d in f"{op // 100}")
+
+
+def _scan_block(memory: MemoryBackend, start: int) -> int:
+    """Find the end address (exclusive) of the block starting at start"""
+    ip = start
+    for _ in range(MAX_BLOCK_INSTRUCTIONS):
+        op = memory[ip]
+        if not _is_valid(op):
+            break
+        instruction = op % 100
+        if instruction in (3, 4):
+            break
+        ip += _PARAMETER_COUNTS[instruction] + 1
+        if instruction in (5, 6, 99):
+            break
+    return ip
+
+
+def _read(mode: ParameterMode, word: int) -> str:
+    if mode == ParameterMode.IMMEDIATE:
+        return str(word)
+    if mode == ParameterMode.RELATIVE:
+        return f"mem[vm.relative_base + {word}]"
+    return f"mem[{word}]"
+
+
+def _write_address(mode: ParameterMode, word: int, address: int) -> str:
+    if mode == ParameterMode.IMMEDIATE:
+        # matches the interpreter, which writes into the parameter itself
+        return str(address)
+    if mode == ParameterMode.RELATIVE:
+        return f"vm.relative_base + {word}"
+    return str(word)
+
+
+@lru_cache(maxsize=4096)
+def compile_block(start: int, words: Tuple[int, ...]) -> Block:
+    """Generate and compile a block function for the given code words"""
+    lines = ["def block(vm, mem):"]
+    ip = start
+    end = start + len(words)
+    terminated = False
+    while ip < end:
+        op = words[ip - start]
+        instruction, modes = _decode(op)
+        size = _PARAMETER_COUNTS[instruction] + 1
+        params = words[ip - start + 1 : ip - start + size]
+        args = [_read(modes[i], params[i]) for i in range(len(params))]
+        next_ip = ip + size
+
+        if instruction in _STRAIGHT_LINE:
+            target = _write_address(modes[2], params[2], ip + 3)
+            expression = f"{args[0]} {_STRAIGHT_LINE[instruction]} {args[1]}"
+            if instruction in (7, 8):
+                expression = f"1 if {expression} else 0"
+            lines.append(f"    vm[{target}] = {expression}")
+            lines.append("    if vm._invalidated:")
+            lines.append(f"        vm.ip = {next_ip}")
+            lines.append("        return")
+        elif instruction == 9:
+            lines.append(f"    vm.relative_base += {args[0]}")
+        elif instruction in (5, 6):
+            condition = "!=" if instruction == 5 else "=="
+            # a jump to its own address is treated as no jump by the interpreter
+            lines.append(f"    target = {args[1]}")
+            lines.append(f"    if {args[0]} {condition} 0 and target != {ip}:")
+            lines.append("        vm.ip = target")
+            lines.append("    else:")
+            lines.append(f"        vm.ip = {next_ip}")
+            terminated = True
+        elif instruction == 99:
+            lines.append(f"    vm.ip = {ip}")
+            lines.append("    vm.halted = True")
+            terminated = True
+        ip = next_ip
+
+    if not terminated:
+        lines.append(f"    vm.ip = {ip}")
+
+    namespace = {}
+    exec(compile("\n".join(lines), f"<intcode block {start}>", "exec"), namespace)
+    return namespace["block"]
+
+
+class CompiledIntCode(IntCode):
+    """IntCode VM that executes compiled basic blocks where it can"""
+
+    compile_threshold = 8
+    """Number of times an address is reached before a block is compiled from it"""
+
+    def __init__(
+        self,
+        code: str,
+        input_func: Optional[Callable[[], int]] = None,
+        memory: Type[MemoryBackend] = SparseMemory,
+        snapshot: Optional[IntCodeSnapshot] = None,
+    ):
+        self._blocks: Dict[int, Optional[Block]] = {}
+        self._hits: Dict[int, int] = {}
+        self._block_ends: Dict[int, int] = {}
+        self._block_cells: Dict[int, List[int]] = {}
+        self._invalidated = False
+        super().__init__(code, input_func, memory, snapshot)
+
+    def _clear_caches(self) -> None:
+        super()._clear_caches()
+        self._blocks = {}
+        self._hits = {}
+        self._block_ends = {}
+        self._block_cells = {}
+        self._invalidated = False
+
+    def run(self, pause_on_output=False, pause_on_input=False):
+        if self.profile is not None:
+            # profile the interpreter, blocks can't be instrumented
+            self._run_profiled(pause_on_output, pause_on_input)
+            return
+
+        while not self.halted:
+            ip = self.ip
+            if ip in self._blocks:
+                block = self._blocks[ip]
+            else:
+                hits = self._hits.get(ip, 0) + 1
+                if hits >= self.compile_threshold:
+                    block = self._compile(ip)
+                else:
+                    self._hits[ip] = hits
+                    block = None
+
+            if block is not None:
+                self._invalidated = False
+                block(self, self._memory)
+                continue
+
+            if pause_on_input and self.waiting_for_input:
+                break
+            ret_val = self.step()
+            if ret_val is None:
+                continue
+
+            self.output.appendleft(ret_val)
+            if pause_on_output:
+                break
+
+    def _compile(self, start: int) -> Optional[Block]:
+        end = _scan_block(self._memory, start)
+        if end == start:
+            self._blocks[start] = None
+            return None
+
+        words = tuple(self._memory[i] for i in range(start, end))
+        block = compile_block(start, words)
+        self._blocks[start] = block
+        self._block_ends[start] = end
+        for address in range(start, end):
+            self._block_cells.setdefault(address, []).append(start)
+        return block
+
+    def _invalidate(self, address: int) -> None:
+        for start in self._block_cells.pop(address):
+            for cell in range(start, self._block_ends.pop(start)):
+                if cell == address:
+                    continue
+                self._block_cells[cell].remove(start)
+                if not self._block_cells[cell]:
+                    del self._block_cells[cell]
+            # don't recompile, fall back to the interpreter from here on
+            self._blocks[start] = None
+        self._invalidated = True
+
+    def __setitem__(self, key, value):
+        self._memory[key] = value
+        if key in self._decoded:
+            del self._decoded[key]
+        if key in self._fused_at:
+            self._decoded.pop(self._fused_at.pop(key), None)
+        if key in self._block_cells:
+            self._invalidate(key)
@@ -0,0 +1,43 @@
+import intcode_test
+from intcode_compiler import CompiledIntCode, compile_block
+
+
+class EagerCompiledIntCode(CompiledIntCode):
+    compile_threshold = 1
+
+
+class CompiledIntCodeTest(intcode_test.IntCodeTest):
+    intcode = EagerCompiledIntCode
+
+    def test_blocks_compiled(self):
+        ic = EagerCompiledIntCode("1101,1,1,9,1101,2,2,10,99,0,0")
+        ic.run()
+        self.assertEqual(4, ic[10])
+        self.assertIsNotNone(ic._blocks[0])
+        self.assertEqual(0, len(ic._decoded))
+
+    def test_io_falls_back_to_interpreter(self):
+        ic = EagerCompiledIntCode("3,0,4,0,99")
+        ic.add_input(8)
+        ic.run()
+        self.assertIsNone(ic._blocks[0])
+        self.assertEqual(8, ic.output[0])
+
+    def test_written_block_falls_back_to_interpreter(self):
+        ic = EagerCompiledIntCode(
+            "1101,3,4,20,1101,1,1101,0,1001,21,1,21,1008,21,2,22,1006,22,0,99"
+        )
+        ic.run()
+        self.assertEqual(12, ic[20])
+        self.assertIsNone(ic._blocks[0])
+
+    def test_compile_block_cached(self):
+        words = (1101, 1, 1, 9, 99)
+        self.assertIs(compile_block(0, words), compile_block(0, words))
+
+    def test_compile_threshold(self):
+        ic = CompiledIntCode("1101,0,3,12,1001,12,-1,12,1005,12,4,99,0")
+        ic.compile_threshold = 2
+        ic.run()
+        self.assertNotIn(0, ic._blocks)
+        self.assertIsNotNone(ic._blocks[4])
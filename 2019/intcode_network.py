@@ -0,0 +1,109 @@
+"""
+Networks of IntCode VMs connected by asyncio queues
+
+Each VM runs as a coroutine that only yields to the event loop when it
+needs input and its inbox is empty, so no time is spent polling VMs that
+can't make progress. Outputs are sent to the inbox of every connected node.
+"""
+import asyncio
+from collections import defaultdict
+from typing import Dict, Hashable, List, Optional, Sequence, Set
+
+from intcode import IntCode
+
+
+class DeadlockError(RuntimeError):
+    """Every running node is waiting for input that can never arrive"""
+
+    pass
+
+
+class IntCodeNetwork:
+    def __init__(self) -> None:
+        self._nodes: Dict[Hashable, IntCode] = {}
+        self._inboxes: Dict[Hashable, asyncio.Queue] = {}
+        self._links: Dict[Hashable, List[Hashable]] = defaultdict(list)
+        self._last_output: Dict[Hashable, int] = {}
+        self._running: Set[Hashable] = set()
+        self._waiting: Set[Hashable] = set()
+
+    @classmethod
+    def ring(cls, vms: Sequence[IntCode]) -> "IntCodeNetwork":
+        """Connect each VM to the next, and the last back to the first, named by index"""
+        network = cls()
+        for name, vm in enumerate(vms):
+            network.add_node(name, vm)
+        for name in range(len(vms)):
+            network.connect(name, (name + 1) % len(vms))
+        return network
+
+    def add_node(self, name: Hashable, vm: IntCode) -> None:
+        if name in self._nodes:
+            raise KeyError(f"node {name!r} already exists")
+        self._nodes[name] = vm
+        self._inboxes[name] = asyncio.Queue()
+
+    def connect(self, source: Hashable, target: Hashable) -> None:
+        """Send every output of source to the input of target"""
+        if source not in self._nodes or target not in self._nodes:
+            raise KeyError(f"unknown node in link {source!r} -> {target!r}")
+        self._links[source].append(target)
+
+    def send(self, name: Hashable, *values: int) -> None:
+        """Queue values for the input of a node"""
+        for value in values:
+            self._inboxes[name].put_nowait(value)
+
+    def last_output(self, name: Hashable) -> Optional[int]:
+        return self._last_output.get(name)
+
+    def run_until_complete(self) -> None:
+        asyncio.run(self.run())
+
+    async def run(self) -> None:
+        """Run every node until they have all halted"""
+        self._running = set(self._nodes)
+        self._waiting = set()
+        tasks = [asyncio.create_task(self._run_node(name)) for name in self._nodes]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _run_node(self, name: Hashable) -> None:
+        vm = self._nodes[name]
+        inbox = self._inboxes[name]
+        targets = [self._inboxes[target] for target in self._links[name]]
+        while True:
+            vm.run(pause_on_input=True)
+            while vm.output:
+                value = vm.output.pop()
+                self._last_output[name] = value
+                for target in targets:
+                    target.put_nowait(value)
+
+            if vm.halted:
+                break
+
+            if inbox.empty():
+                self._waiting.add(name)
+                self._check_deadlock()
+                try:
+                    value = await inbox.get()
+                finally:
+                    self._waiting.discard(name)
+                vm.add_input(value)
+            while not inbox.empty():
+                vm.add_input(inbox.get_nowait())
+
+        self._running.discard(name)
+        self._check_deadlock()
+
+    def _check_deadlock(self) -> None:
+        if not self._waiting or self._waiting != self._running:
+            return
+        if all(self._inboxes[name].empty() for name in self._waiting):
+            raise DeadlockError(
+                "all running nodes are waiting for input", self._waiting
+            )
@@ -0,0 +1,50 @@
+from unittest import TestCase
+
+from intcode import IntCode
+from intcode_network import IntCodeNetwork, DeadlockError
+
+
+class IntCodeNetworkTest(TestCase):
+    def test_feedback_ring(self):
+        code = (
+            "3,26,1001,26,-4,26,3,27,1002,27,2,27,1,27,26,"
+            "27,4,27,1001,28,-1,28,1005,28,6,99,0,0,5"
+        )
+        network = IntCodeNetwork.ring([IntCode(code) for _ in range(5)])
+        for i, phase in enumerate([9, 8, 7, 6, 5]):
+            network.send(i, phase)
+        network.send(0, 0)
+        network.run_until_complete()
+        self.assertEqual(139629729, network.last_output(4))
+
+    def test_fan_out_fan_in(self):
+        double = "3,0,102,2,0,0,4,0,99"
+        add = "3,0,3,1,1,0,1,0,4,0,99"
+        network = IntCodeNetwork()
+        network.add_node("source", IntCode("104,3,104,5,99"))
+        network.add_node("left", IntCode(double))
+        network.add_node("right", IntCode(double))
+        network.add_node("sum", IntCode(add))
+        network.connect("source", "left")
+        network.connect("source", "right")
+        network.connect("left", "sum")
+        network.connect("right", "sum")
+        network.run_until_complete()
+        self.assertEqual(6, network.last_output("left"))
+        self.assertEqual(12, network.last_output("sum"))
+
+    def test_long_chain(self):
+        increment = "3,0,1001,0,1,0,4,0,99"
+        network = IntCodeNetwork()
+        for i in range(200):
+            network.add_node(i, IntCode(increment))
+            if i:
+                network.connect(i - 1, i)
+        network.send(0, 0)
+        network.run_until_complete()
+        self.assertEqual(200, network.last_output(199))
+
+    def test_deadlock(self):
+        network = IntCodeNetwork.ring([IntCode("3,0,4,0,99"), IntCode("3,0,4,0,99")])
+        with self.assertRaises(DeadlockError):
+            network.run_until_complete()
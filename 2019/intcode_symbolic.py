@@ -0,0 +1,179 @@
+"""
+Symbolic execution of IntCode programs over affine expressions
+
+Memory cells can hold an Affine expression (a constant plus integer multiples
+of named symbols) instead of an int. Add and multiply by a constant keep
+expressions affine. Reading through a symbolic address, or multiplying two
+symbols, gives UNKNOWN, which is fine as long as the value is overwritten
+before it matters. Anything that would make control flow or writes depend on
+a symbol (branching, comparing, writing through a symbolic address) raises
+SymbolicError so the caller can fall back to concrete execution.
+"""
+from typing import Dict, Mapping, Optional, Sequence, Tuple, Union
+
+from intcode import IntCode, Parameter
+
+Value = Union[int, "Affine", "_Unknown"]
+
+
+class SymbolicError(Exception):
+    """The program can't be run symbolically, e.g. it branches on a symbol"""
+
+    pass
+
+
+def _concrete_only(self, *_) -> bool:
+    raise SymbolicError("value depends on a symbol", self)
+
+
+class _Unknown:
+    """A value that depends on the symbols in some non affine way"""
+
+    def _unknown(self, _=None) -> "_Unknown":
+        return self
+
+    __add__ = __radd__ = __mul__ = __rmul__ = _unknown
+
+    __eq__ = __ne__ = __lt__ = __le__ = __gt__ = __ge__ = _concrete_only
+    __bool__ = __index__ = __int__ = _concrete_only
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return "UNKNOWN"
+
+
+UNKNOWN = _Unknown()
+
+
+class Affine:
+    __slots__ = ("constant", "terms")
+
+    def __init__(self, constant: int, terms: Mapping[str, int]) -> None:
+        self.constant = constant
+        self.terms: Dict[str, int] = dict(terms)
+
+    @classmethod
+    def symbol(cls, name: str) -> "Affine":
+        return cls(0, {name: 1})
+
+    @classmethod
+    def _make(cls, constant: int, terms: Mapping[str, int]) -> Value:
+        terms = {name: k for name, k in terms.items() if k != 0}
+        if not terms:
+            return constant
+        return cls(constant, terms)
+
+    def __add__(self, other: Value) -> Value:
+        if isinstance(other, int):
+            return self._make(self.constant + other, self.terms)
+        if isinstance(other, Affine):
+            terms = self.terms.copy()
+            for name, k in other.terms.items():
+                terms[name] = terms.get(name, 0) + k
+            return self._make(self.constant + other.constant, terms)
+        return NotImplemented
+
+    __radd__ = __add__
+
+    def __mul__(self, other: Value) -> Value:
+        if isinstance(other, int):
+            terms = {name: k * other for name, k in self.terms.items()}
+            return self._make(self.constant * other, terms)
+        if isinstance(other, Affine):
+            return UNKNOWN
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+    __eq__ = __ne__ = __lt__ = __le__ = __gt__ = __ge__ = _concrete_only
+    __bool__ = __index__ = __int__ = _concrete_only
+    __hash__ = None
+
+    def evaluate(self, **values: int) -> int:
+        return self.constant + sum(k * values[name] for name, k in self.terms.items())
+
+    def __repr__(self) -> str:
+        terms = " + ".join(f"{k}*{name}" for name, k in sorted(self.terms.items()))
+        return f"{terms} + {self.constant}"
+
+
+class SymbolicIntCode(IntCode):
+    """IntCode VM whose memory may hold affine expressions"""
+
+    def get(self, address: Parameter) -> Value:
+        resolved = self._get_address(address)
+        if not isinstance(resolved, int):
+            return UNKNOWN
+        return self._memory[resolved]
+
+    def set(self, address: Parameter, value: Value):
+        resolved = self._get_address(address)
+        if not isinstance(resolved, int):
+            raise SymbolicError("write address depends on a symbol", resolved)
+        self[resolved] = value
+
+    def _parse_opcode(self, op: Value):
+        if not isinstance(op, int):
+            raise SymbolicError("opcode depends on a symbol", op)
+        return super()._parse_opcode(op)
+
+
+def solve_noun_verb(
+    program: str,
+    target: int,
+    nouns: Sequence[int] = range(100),
+    verbs: Sequence[int] = range(100),
+    output_address: int = 0,
+) -> Optional[Tuple[int, int]]:
+    """
+    Find the first (noun, verb) that leaves target at output_address
+
+    The program is run once with the noun and verb (addresses 1 and 2) as
+    symbols, if the result is affine in them it's solved directly, otherwise
+    each pair is run concretely.
+    """
+    vm = SymbolicIntCode(program)
+    vm[1] = Affine.symbol("noun")
+    vm[2] = Affine.symbol("verb")
+    try:
+        vm.run()
+        result = vm[output_address]
+    except SymbolicError:
+        return _search_noun_verb(program, target, nouns, verbs, output_address)
+
+    if result is UNKNOWN:
+        return _search_noun_verb(program, target, nouns, verbs, output_address)
+    if isinstance(result, int):
+        if result == target and nouns and verbs:
+            return nouns[0], verbs[0]
+        return None
+
+    a = result.terms.get("noun", 0)
+    b = result.terms.get("verb", 0)
+    for noun in nouns:
+        remainder = target - result.constant - a * noun
+        if b == 0:
+            if remainder == 0 and verbs:
+                return noun, verbs[0]
+        elif remainder % b == 0 and remainder // b in verbs:
+            return noun, remainder // b
+    return None
+
+
+def _search_noun_verb(
+    program: str,
+    target: int,
+    nouns: Sequence[int],
+    verbs: Sequence[int],
+    output_address: int,
+) -> Optional[Tuple[int, int]]:
+    template = IntCode(program)
+    for noun in nouns:
+        for verb in verbs:
+            vm = template.fork()
+            vm[1] = noun
+            vm[2] = verb
+            vm.run()
+            if vm[output_address] == target:
+                return noun, verb
+    return None
@@ -0,0 +1,49 @@
+from unittest import TestCase
+
+from intcode_symbolic import (
+    Affine,
+    SymbolicError,
+    SymbolicIntCode,
+    UNKNOWN,
+    solve_noun_verb,
+)
+
+
+class IntCodeSymbolicTest(TestCase):
+    def test_affine(self):
+        x = Affine.symbol("x")
+        y = Affine.symbol("y")
+        expression = 3 * (x + 2) + y * 4 + 1
+        self.assertEqual({"x": 3, "y": 4}, expression.terms)
+        self.assertEqual(7, expression.constant)
+        self.assertEqual(17, expression.evaluate(x=2, y=1))
+        self.assertEqual(5, x + 5 + x * -1)
+        self.assertIs(UNKNOWN, x * y)
+        with self.assertRaises(SymbolicError):
+            bool(x == 1)
+
+    def test_symbolic_run(self):
+        # mem[0] = (mem[1] * 3 + mem[2]) after a read through the noun as an address
+        vm = SymbolicIntCode("1,0,0,0,1002,1,3,0,1,0,2,0,99")
+        vm[1] = Affine.symbol("noun")
+        vm[2] = Affine.symbol("verb")
+        vm.run()
+        self.assertEqual({"noun": 3, "verb": 1}, vm[0].terms)
+
+    def test_branch_on_symbol(self):
+        vm = SymbolicIntCode("1005,1,4,99,99")
+        vm[1] = Affine.symbol("noun")
+        with self.assertRaises(SymbolicError):
+            vm.run()
+
+    def test_solve(self):
+        program = "1,0,0,0,1002,1,3,0,1,0,2,0,99"
+        self.assertEqual((0, 30), solve_noun_verb(program, 30))
+        self.assertEqual((7, 9), solve_noun_verb(program, 30, verbs=range(10)))
+        self.assertIsNone(solve_noun_verb(program, 30, nouns=range(3), verbs=range(3)))
+
+    def test_solve_falls_back_when_branching(self):
+        # mem[0] = 7 if noun == 5 else noun, with the verb ignored
+        program = "1,0,0,22,1008,1,5,23,1005,23,16,1001,1,0,0,99,1101,7,0,0,99,0,0,0"
+        self.assertEqual((5, 0), solve_noun_verb(program, 7))
+        self.assertEqual((3, 0), solve_noun_verb(program, 3))
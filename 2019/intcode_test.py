@@ -2,39 +2,47 @@ from math import log10
 from unittest import TestCase
 
 import intcode
-from intcode import IntCode
+from intcode import (
+    IntCode,
+    DenseMemory,
+    ExecutionProfile,
+    FusedOperation,
+    SparseMemory,
+)
 
 
 class IntCodeTest(TestCase):
+    intcode = IntCode
+
     @classmethod
     def setUpClass(cls) -> None:
         intcode.SUPPRESS_OUTPUT = False
 
     def test_add(self):
-        ic = IntCode("1, 1, 2, 0, 99")
+        ic = self.intcode("1, 1, 2, 0, 99")
         ic.run()
         self.assertEqual(3, ic[0])
 
     def test_multiply(self):
-        ic = IntCode("2, 1, 2, 0, 99")
+        ic = self.intcode("2, 1, 2, 0, 99")
         ic.run()
         self.assertEqual(2, ic[0])
 
     def test_simple(self):
-        ic = IntCode("1,9,10,3,2,3,11,0,99,30,40,50")
+        ic = self.intcode("1,9,10,3,2,3,11,0,99,30,40,50")
         ic.run()
         self.assertEqual(
             [3500, 9, 10, 70, 2, 3, 11, 0, 99, 30, 40, 50], list(ic._memory.values())
         )
 
     def test_inputoutput(self):
-        ic = IntCode("3,0,4,0,99")
+        ic = self.intcode("3,0,4,0,99")
         ic.add_input(8)
         ic.run()
         self.assertEqual(8, ic.output[0])
 
     def test_equal_to_8_position(self):
-        ic = IntCode("3,9,8,9,10,9,4,9,99,-1,8")
+        ic = self.intcode("3,9,8,9,10,9,4,9,99,-1,8")
         ic.add_input(8)
         ic.run()
         self.assertEqual(1, ic.output[0])
@@ -45,7 +53,7 @@ class IntCodeTest(TestCase):
         self.assertEqual(0, ic.output[0])
 
     def test_less_than_8_position(self):
-        ic = IntCode("3,9,7,9,10,9,4,9,99,-1,8")
+        ic = self.intcode("3,9,7,9,10,9,4,9,99,-1,8")
         ic.add_input(7)
         ic.run()
         self.assertEqual(1, ic.output[0])
@@ -56,7 +64,7 @@ class IntCodeTest(TestCase):
         self.assertEqual(0, ic.output[0])
 
     def test_equal_to_8_immediate(self):
-        ic = IntCode("3,3,1108,-1,8,3,4,3,99")
+        ic = self.intcode("3,3,1108,-1,8,3,4,3,99")
         ic.add_input(8)
         ic.run()
         self.assertEqual(1, ic.output[0])
@@ -67,7 +75,7 @@ class IntCodeTest(TestCase):
         self.assertEqual(0, ic.output[0])
 
     def test_less_than_8_immediate(self):
-        ic = IntCode("3,3,1107,-1,8,3,4,3,99")
+        ic = self.intcode("3,3,1107,-1,8,3,4,3,99")
         ic.add_input(7)
         ic.run()
         self.assertEqual(1, ic.output[0])
@@ -78,7 +86,7 @@ class IntCodeTest(TestCase):
         self.assertEqual(0, ic.output[0])
 
     def test_jump_position(self):
-        ic = IntCode("3,12,6,12,15,1,13,14,13,4,13,99,-1,0,1,9")
+        ic = self.intcode("3,12,6,12,15,1,13,14,13,4,13,99,-1,0,1,9")
         ic.add_input(0)
         ic.run()
         self.assertEqual(0, ic.output[0])
@@ -89,7 +97,7 @@ class IntCodeTest(TestCase):
         self.assertEqual(1, ic.output[0])
 
     def test_jump_immediate(self):
-        ic = IntCode("3,3,1105,-1,9,1101,0,0,12,4,12,99,1")
+        ic = self.intcode("3,3,1105,-1,9,1101,0,0,12,4,12,99,1")
         ic.add_input(0)
         ic.run()
         self.assertEqual(0, ic.output[0])
@@ -100,7 +108,7 @@ class IntCodeTest(TestCase):
         self.assertEqual(1, ic.output[0])
 
     def test_equality(self):
-        ic = IntCode(
+        ic = self.intcode(
             """
 3,21,1008,21,8,20,1005,20,22,107,8,21,20,1006,20,31,
 1106,0,36,98,0,0,1002,21,125,20,4,20,1105,1,46,104,
@@ -121,18 +129,231 @@ class IntCodeTest(TestCase):
         self.assertEqual(1001, ic.output[0])
 
     def test_relative_mode_output(self):
-        ic = IntCode("109,1,204,-1,1001,100,1,100,1008,100,16,101,1006,101,0,99")
+        ic = self.intcode("109,1,204,-1,1001,100,1,100,1008,100,16,101,1006,101,0,99")
         ic.run()
         output = reversed(ic.output)
         output_code = ",".join([str(i) for i in output])
         self.assertEqual(ic._code, output_code)
 
     def test_relative_mode_16_digit_number(self):
-        ic = IntCode("1102,34915192,34915192,7,4,7,99,0")
+        ic = self.intcode("1102,34915192,34915192,7,4,7,99,0")
         ic.run()
         self.assertEqual(16, int(log10(ic.output[0])) + 1)
 
     def test_relative_mode(self):
-        ic = IntCode("104,1125899906842624,99")
+        ic = self.intcode("104,1125899906842624,99")
         ic.run()
         self.assertEqual(1125899906842624, ic.output[0])
+
+    def test_decoded_instruction_cache(self):
+        ic = IntCode("1101,1,1,9,1101,2,2,10,99,0,0")
+        ic.run()
+        self.assertEqual(2, ic[9])
+        self.assertEqual(4, ic[10])
+        self.assertIn(0, ic._decoded)
+        self.assertIn(8, ic._decoded)
+
+    def test_self_modifying_invalidates_cache(self):
+        # The first pass adds, then rewrites the opcode at 0 to a multiply
+        ic = self.intcode(
+            "1101,3,4,20,1101,1,1101,0,1001,21,1,21,1008,21,2,22,1006,22,0,99"
+        )
+        ic.run()
+        self.assertEqual(12, ic[20])
+
+    def test_dense_memory(self):
+        ic = self.intcode("1,9,10,3,2,3,11,0,99,30,40,50", memory=DenseMemory)
+        ic.run()
+        self.assertEqual(
+            [3500, 9, 10, 70, 2, 3, 11, 0, 99, 30, 40, 50], list(ic._memory.values())
+        )
+
+    def test_dense_memory_overflow(self):
+        memory = DenseMemory.from_image([1, 2, 3])
+        memory[10] = 4
+        memory[1 << 40] = 5
+        memory[-1] = 6
+        self.assertEqual(4, memory[10])
+        self.assertEqual(0, memory[9])
+        self.assertEqual(5, memory[1 << 40])
+        self.assertEqual(6, memory[-1])
+        self.assertEqual(0, memory[1 << 41])
+
+    def test_dense_memory_boost(self):
+        code = "109,1,204,-1,1001,100,1,100,1008,100,16,101,1006,101,0,99"
+        ic = self.intcode(code, memory=DenseMemory)
+        ic.run()
+        self.assertEqual(code, ",".join(str(i) for i in reversed(ic.output)))
+
+    def test_iter_outputs(self):
+        code = "109,1,204,-1,1001,100,1,100,1008,100,16,101,1006,101,0,99"
+        ic = self.intcode(code)
+        self.assertEqual(code, ",".join(str(i) for i in ic.iter_outputs()))
+        self.assertTrue(ic.halted)
+        self.assertEqual(0, len(ic.output))
+
+    def test_run_until_output(self):
+        ic = self.intcode("109,1,204,-1,1001,100,1,100,1008,100,16,101,1006,101,0,99")
+        self.assertEqual([109, 1, 204], ic.run_until_output(3))
+        self.assertFalse(ic.halted)
+        self.assertEqual([-1, 1001], ic.run_until_output(2))
+        self.assertEqual(11, len(ic.run_until_output(100)))
+        self.assertEqual([], ic.run_until_output())
+
+    def test_fork(self):
+        ic = self.intcode("3,20,3,21,1,20,21,22,4,22,99")
+        ic.add_input(1)
+        ic.run_until_output(0)
+        ic.step()
+        fork = ic.fork()
+        ic.add_input(2)
+        fork.add_input(40)
+        self.assertEqual([3], ic.run_until_output())
+        self.assertEqual([41], fork.run_until_output())
+        self.assertEqual(3, ic[22])
+        self.assertEqual(41, fork[22])
+
+    def test_snapshot_restore(self):
+        ic = self.intcode("3,20,3,21,1,20,21,22,4,22,99", memory=DenseMemory)
+        ic.add_input(1)
+        ic.step()
+        snapshot = ic.snapshot()
+        for value, expected in [(2, 3), (5, 6), (2, 3)]:
+            ic.restore(snapshot)
+            ic.add_input(value)
+            self.assertEqual([expected], ic.run_until_output())
+            self.assertTrue(ic.halted or ic.run_until_output() == [])
+        self.assertEqual(0, snapshot.memory[22])
+
+    def test_dense_memory_fork_copy_on_write(self):
+        memory = DenseMemory.from_image(range(3000))
+        fork = memory.fork()
+        fork[5] = -5
+        memory[2000] = -2000
+        self.assertEqual(5, memory[5])
+        self.assertEqual(-5, fork[5])
+        self.assertEqual(2000, fork[2000])
+        self.assertEqual(-2000, memory[2000])
+        self.assertIs(memory._pages[2], fork._pages[2])
+
+    def test_sparse_memory_fork_copy_on_write(self):
+        memory = SparseMemory.from_image(range(10))
+        fork = memory.fork()
+        self.assertIs(memory._base, fork._base)
+        fork[5] = -5
+        memory[7] = -7
+        self.assertEqual(5, memory[5])
+        self.assertEqual(-5, fork[5])
+        self.assertEqual(7, fork[7])
+        self.assertEqual(0, fork[100])
+        self.assertEqual([0, 1, 2, 3, 4, -5, 6, 7, 8, 9, 0], list(fork.values()))
+        # memory was written to, so its next fork gets a new base
+        second = memory.fork()
+        self.assertIsNot(fork._base, second._base)
+        self.assertIs(second._base, memory.fork()._base)
+        self.assertEqual(-7, second[7])
+
+    def test_sparse_memory_dict_api_includes_base(self):
+        fork = SparseMemory.from_image([1, 2, 3]).fork()
+        fork[10] = 4
+        fork[1] = 5
+        self.assertEqual(4, len(fork))
+        self.assertIn(0, fork)
+        self.assertNotIn(5, fork)
+        self.assertEqual(1, fork.get(0))
+        self.assertIsNone(fork.get(5))
+        self.assertEqual([0, 1, 2, 10], sorted(fork))
+        self.assertEqual([0, 1, 2, 10], sorted(fork.keys()))
+        self.assertEqual([(0, 1), (1, 5), (2, 3), (10, 4)], sorted(fork.items()))
+
+    def test_run_many(self):
+        program = "3,9,8,9,10,9,4,9,99,-1,8"
+        for workers in (1, 2):
+            results = self.intcode.run_many(program, [[7], [8], [9]], workers=workers)
+            self.assertEqual([(0,), (1,), (0,)], [r.outputs for r in results])
+
+    def test_run_many_patches(self):
+        results = self.intcode.run_many(
+            "1,0,0,0,99",
+            [()] * 3,
+            workers=2,
+            patches=[{1: 1, 2: 2}, {1: 0, 2: 4}, {1: 4, 2: 4}],
+            read=(0,),
+        )
+        self.assertEqual([(3,), (100,), (198,)], [r.memory for r in results])
+
+    def test_pause_on_input(self):
+        ic = self.intcode("104,1,3,9,4,9,99,0,0,0")
+        ic.run(pause_on_input=True)
+        self.assertTrue(ic.waiting_for_input)
+        self.assertFalse(ic.halted)
+        self.assertEqual([1], list(ic.output))
+        ic.add_input(5)
+        ic.run(pause_on_input=True)
+        self.assertTrue(ic.halted)
+        self.assertEqual(5, ic.output[0])
+
+    def test_profile(self):
+        ic = self.intcode("3,9,8,9,10,9,4,9,99,-1,8")
+        ic.profile = ExecutionProfile()
+        ic.add_input(8)
+        ic.run()
+        self.assertEqual(1, ic.output[0])
+        self.assertEqual(
+            {"Input": 1, "Equals": 1, "Output": 1, "Halt": 1}, dict(ic.profile.opcodes)
+        )
+        self.assertEqual({0: 1, 2: 1, 6: 1, 8: 1}, dict(ic.profile.addresses))
+        self.assertEqual(2, ic.profile.writes[9])
+        self.assertEqual(2, ic.profile.reads[9])
+        self.assertNotIn("Profiled", type(ic._memory).__name__)
+        self.assertIn('"Equals": 1', ic.profile.to_json())
+
+    def test_profile_snapshot_restore(self):
+        snapshots = []
+
+        def snapshot_and_restore():
+            snapshots.append(ic.snapshot())
+            ic.restore(snapshots[0])
+            return 7
+
+        ic = self.intcode("3,9,8,9,10,9,4,9,99,-1,8", snapshot_and_restore)
+        ic.profile = ExecutionProfile()
+        ic.run()
+        self.assertEqual(0, ic.output[0])
+        # the restored memory is still profiled, snapshots are not
+        self.assertEqual(1, ic.profile.reads[10])
+        self.assertNotIn("Profiled", type(snapshots[0].memory).__name__)
+        self.assertNotIn("Profiled", type(ic._memory).__name__)
+
+    def test_profile_jump_targets(self):
+        ic = self.intcode("1101,0,3,12,1001,12,-1,12,1005,12,4,99,0")
+        ic.profile = ExecutionProfile()
+        ic.run()
+        self.assertEqual({4: 2}, dict(ic.profile.jump_targets))
+        self.assertEqual(3, ic.profile.addresses[4])
+
+    def test_fused_instructions(self):
+        ic = self.intcode("3,13,1008,13,8,14,1005,14,10,99,104,1,99,0,0")
+        ic.fuse = True
+        ic.add_input(8)
+        ic.run()
+        self.assertEqual(1, ic.output[0])
+        if self.intcode is IntCode:
+            self.assertIsInstance(ic._decoded[2], FusedOperation)
+
+    def test_jump_into_fused_pair(self):
+        # loop back to the add half of a (multiply, add) pair
+        ic = self.intcode(
+            "1102,2,3,20,1001,20,1,20,1001,21,1,21,1007,21,3,22,1005,22,4,99"
+        )
+        ic.fuse = True
+        ic.run()
+        self.assertEqual(9, ic[20])
+
+    def test_fused_pair_overwritten(self):
+        # the first half rewrites the opcode of the second half from add to multiply
+        ic = self.intcode("1101,1,1101,4,1101,3,4,20,99")
+        ic.fuse = True
+        ic.run()
+        self.assertEqual(1102, ic[4])
+        self.assertEqual(12, ic[20])
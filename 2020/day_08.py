@@ -1,7 +1,8 @@
 import logging
 import re
 from abc import ABC, abstractmethod
-from typing import Iterable, List
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
 from unittest import TestCase
 
 logging.basicConfig(level=logging.INFO)
@@ -54,16 +55,25 @@ class Nop(Operation):
         pass
 
 
+ACC, JMP, NOP = range(3)
+OPCODES = {"acc": ACC, "jmp": JMP, "nop": NOP}
+_INVALID = 255
+
+
 class BootCode(Computer):
     INSTRUCTION_REGEX = re.compile(r"([a-z]{3}) ([-+]\d+)")
 
     def __init__(self, instructions: Iterable[str]):
         self._instructions = list(instructions)
+        self._opcodes = bytearray(len(self._instructions))
+        self._arguments: List[int] = [0] * len(self._instructions)
+        self._errors: Dict[int, HaltError] = {}
+        self._parse()
         self.accumulator = 0
         self.ip = 0
         self.halted = False
         self.infinite_loop = False
-        self.executed_instructions = set()
+        self._visited = bytearray(len(self._instructions))
         self.reset()
 
     def reset(self):
@@ -71,15 +81,68 @@ class BootCode(Computer):
         self.ip = 0
         self.halted = False
         self.infinite_loop = False
-        self.executed_instructions = set()
+        self._visited = bytearray(len(self._instructions))
 
     @property
     def instructions(self) -> List[str]:
         return self._instructions
 
-    def run(self):
+    @property
+    def executed_instructions(self) -> Set[int]:
+        return {ip for ip, visited in enumerate(self._visited) if visited}
+
+    def _parse(self) -> None:
+        """Parse every instruction once into the opcode and argument arrays"""
+        for ip, instruction in enumerate(self._instructions):
+            try:
+                self._opcodes[ip], self._arguments[ip] = _decode(instruction)
+            except HaltError as err:
+                # only an error if the instruction is reached
+                self._opcodes[ip] = _INVALID
+                self._errors[ip] = err
+
+    def run(self, trace: bool = False):
+        """
+        Run until the program terminates or an instruction is about to run twice
+
+        :param trace: log every instruction executed, much slower
+        """
+        if trace:
+            self._run_traced()
+            return
+
+        opcodes = self._opcodes
+        arguments = self._arguments
+        visited = self._visited
+        end = len(opcodes)
+        ip = self.ip
+        accumulator = self.accumulator
+        try:
+            while not self.halted and ip < end:
+                if visited[ip]:
+                    self.infinite_loop = True
+                    self.halted = True
+                    break
+                visited[ip] = 1
+
+                op = opcodes[ip]
+                if op == ACC:
+                    accumulator += arguments[ip]
+                    ip += 1
+                elif op == JMP:
+                    # jmp +0 moves on, like any other instruction that leaves ip alone
+                    ip += arguments[ip] or 1
+                elif op == NOP:
+                    ip += 1
+                else:
+                    raise self._errors[ip]
+        finally:
+            self.ip = ip
+            self.accumulator = accumulator
+
+    def _run_traced(self):
         while not self.halted and self.ip < len(self._instructions):
-            if self.ip in self.executed_instructions:
+            if self._visited[self.ip]:
                 LOGGER.debug("Infinite Loop Detected!")
                 self.infinite_loop = True
                 self.halted = True
@@ -101,13 +164,72 @@ class BootCode(Computer):
                 self.halted = True
                 break
             finally:
-                self.executed_instructions.add(prev_ip)
+                self._visited[prev_ip] = 1
 
             if self.ip == prev_ip:
                 self.ip += 1
 
-    def _parse_instruction(self, instruction: str) -> Operation:
-        if not (matches := self.INSTRUCTION_REGEX.match(instruction)):
+    def _successor(self, ip: int, op: int) -> int:
+        if op == JMP:
+            return ip + (self._arguments[ip] or 1)
+        return ip + 1
+
+    def find_repair(self) -> Optional["Repair"]:
+        """
+        Find the single jmp/nop flip that makes the program terminate
+
+        Works backwards from termination to find every instruction that leads
+        to the end of the program, then follows the program from the start
+        until a flipped jmp/nop would land on one of them.
+        """
+        end = len(self._opcodes)
+        predecessors: List[List[int]] = [[] for _ in range(end)]
+        terminating = bytearray(end + 1)
+        terminating[end] = 1
+        pending = []
+        for ip, op in enumerate(self._opcodes):
+            if op == _INVALID:
+                continue
+            successor = self._successor(ip, op)
+            if successor >= end:
+                terminating[ip] = 1
+                pending.append(ip)
+            elif successor >= 0:
+                predecessors[successor].append(ip)
+
+        while pending:
+            for ip in predecessors[pending.pop()]:
+                if not terminating[ip]:
+                    terminating[ip] = 1
+                    pending.append(ip)
+
+        if terminating[0]:
+            return self._repaired(None)
+
+        visited = bytearray(end)
+        ip = 0
+        while 0 <= ip < end and not visited[ip] and self._opcodes[ip] != _INVALID:
+            visited[ip] = 1
+            op = self._opcodes[ip]
+            if op != ACC:
+                flipped = self._successor(ip, NOP if op == JMP else JMP)
+                if flipped >= end or (flipped >= 0 and terminating[flipped]):
+                    return self._repaired(ip)
+            ip = self._successor(ip, op)
+        return None
+
+    def _repaired(self, address: Optional[int]) -> "Repair":
+        instructions = list(self._instructions)
+        if address is not None:
+            name = "nop" if self._opcodes[address] == JMP else "jmp"
+            instructions[address] = name + instructions[address][3:]
+        bc = BootCode(instructions)
+        bc.run()
+        return Repair(instructions, bc.accumulator, address)
+
+    @classmethod
+    def _parse_instruction(cls, instruction: str) -> Operation:
+        if not (matches := cls.INSTRUCTION_REGEX.match(instruction)):
             raise HaltError("invalid instruction", instruction)
         op = matches[1]
         argument = int(matches[2])
@@ -116,6 +238,21 @@ class BootCode(Computer):
         return OP_MAP[op](argument)
 
 
+class Repair(NamedTuple):
+    instructions: List[str]
+    accumulator: int
+    """Accumulator when the repaired program terminates"""
+    address: Optional[int]
+    """Address of the flipped instruction, None if the program already terminated"""
+
+
+@lru_cache(maxsize=None)
+def _decode(instruction: str) -> Tuple[int, int]:
+    """Opcode and argument of an instruction, shared between programs"""
+    operation = BootCode._parse_instruction(instruction)
+    return OPCODES[type(operation).__name__.lower()], operation.argument
+
+
 class BootCodeTest(TestCase):
     def test_execute(self):
         bc = BootCode(
@@ -133,27 +270,64 @@ class BootCodeTest(TestCase):
         )
         bc.run()
         self.assertEqual(5, bc.accumulator)
+        self.assertTrue(bc.infinite_loop)
+        self.assertEqual({0, 1, 2, 3, 4, 6, 7}, bc.executed_instructions)
+
+    def test_trace_matches(self):
+        instructions = ("acc +2", "jmp +2", "acc +100", "nop -3", "acc -1")
+        fast = BootCode(instructions)
+        fast.run()
+        traced = BootCode(instructions)
+        with self.assertLogs(LOGGER, logging.DEBUG):
+            traced.run(trace=True)
+        self.assertEqual(1, fast.accumulator)
+        self.assertFalse(fast.infinite_loop)
+        self.assertEqual(
+            (traced.accumulator, traced.ip, traced.executed_instructions),
+            (fast.accumulator, fast.ip, fast.executed_instructions),
+        )
 
+    def test_find_repair(self):
+        bc = BootCode(
+            (
+                "nop +0",
+                "acc +1",
+                "jmp +4",
+                "acc +3",
+                "jmp -3",
+                "acc -99",
+                "acc +1",
+                "jmp -4",
+                "acc +6",
+            )
+        )
+        repair = bc.find_repair()
+        self.assertEqual(7, repair.address)
+        self.assertEqual("nop -4", repair.instructions[7])
+        self.assertEqual(8, repair.accumulator)
+        self.assertEqual("jmp -4", bc.instructions[7])
+
+    def test_find_repair_none(self):
+        bc = BootCode(("jmp +2", "acc +1", "jmp -1", "jmp -3"))
+        self.assertIsNone(bc.find_repair())
+        repair = BootCode(("acc +1", "nop +0")).find_repair()
+        self.assertEqual((None, 1), (repair.address, repair.accumulator))
+        with self.assertRaises(ValueError):
+            part2(["jmp +2", "acc +1", "jmp -1", "jmp -3"])
+
+    def test_invalid_instruction(self):
+        bc = BootCode(("acc +1", "jmp +2", "bad +0", "acc +1"))
+        bc.run()
+        self.assertEqual(2, bc.accumulator)
+        with self.assertRaises(HaltError):
+            BootCode(("acc +1", "bad +0")).run()
 
-def part2(instructions: List[str]) -> int:
-    # brute force swapping one nop/jmp at a time
-    for i, instruction in enumerate(instructions):
-        if instruction.startswith("nop"):
-            old_instruction = instruction
-            instructions[i] = instruction.replace("nop", "jmp")
-        elif instruction.startswith("jmp"):
-            old_instruction = instruction
-            instructions[i] = instruction.replace("jmp", "nop")
-        else:
-            continue
 
-        bc = BootCode(instructions)
-        bc.run()
-        if bc.infinite_loop:
-            # if the program infinite looped, then swap instruction back
-            instructions[i] = old_instruction
-            continue
-        return bc.accumulator
+def part2(instructions: List[str]) -> int:
+    repair = BootCode(instructions).find_repair()
+    if repair is None:
+        raise ValueError("no single jmp/nop change lets the program terminate")
+    return repair.accumulator
 
 
 if __name__ == "__main__":
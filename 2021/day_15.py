@@ -1,9 +1,10 @@
 from __future__ import annotations
 
-from functools import cached_property, total_ordering
+import heapq
+import math
+from array import array
+from functools import cached_property
 from pathlib import Path
-from queue import PriorityQueue
-from typing import Iterable
 
 
 def print_grid(grid: Grid):
@@ -11,12 +12,15 @@ def print_grid(grid: Grid):
         print("".join(str(grid.get_risk(x, y)) for x in range(grid.max_x + 1)))
 
 
-@total_ordering
 class Route:
     def __init__(self, nodes: list[tuple[int, int]], grid: Grid):
         self._nodes = nodes
         self._grid = grid
 
+    @property
+    def nodes(self) -> list[tuple[int, int]]:
+        return self._nodes
+
     @cached_property
     def end(self) -> tuple[int, int]:
         return self._nodes[-1]
@@ -35,25 +39,10 @@ class Route:
             return 0
         return sum(self._grid.get_risk(x, y) for x, y in self._nodes[1:])
 
-    @cached_property
-    def priority(self) -> int:
-        closeness = (self._grid.max_x - self.x) + (self._grid.max_y - self.y)
-        return self.risk + closeness + len(self._nodes)
-
     @cached_property
     def is_complete(self) -> bool:
         return self.x == self._grid.max_x and self.y == self._grid.max_y
 
-    @cached_property
-    def neighbours(self) -> Iterable[Route]:
-        x, y = self.end
-        for d_x, d_y in ((0, 1), (0, -1), (1, 0), (-1, 0)):
-            if (d_x, d_y) == (0, 0):
-                continue
-            p_x, p_y = (x + d_x, y + d_y)
-            if 0 <= p_x <= self._grid.max_x and 0 <= p_y <= self._grid.max_y:
-                yield Route(self._nodes + [(p_x, p_y)], self._grid)
-
     def __contains__(self, item):
         return item in self._nodes
 
@@ -62,16 +51,11 @@ class Route:
             return NotImplemented
         return self._nodes == other._nodes
 
-    def __lt__(self, other):
-        if not isinstance(other, type(self)):
-            return NotImplemented
-        return self.priority < other.priority
-
     def __hash__(self):
         return hash(tuple(self._nodes))
 
     def __repr__(self):
-        return f"Route<{self.priority}: {self._nodes}>"
+        return f"Route<{self.risk}: {self._nodes}>"
 
 
 class Grid(list[list[int]]):
@@ -99,26 +83,63 @@ class Grid(list[list[int]]):
             return val % 9
         return val
 
-
-def pathfind(grid: Grid) -> Route:
-    seen: set[tuple[int, int]] = set()
-    routes: PriorityQueue[Route] = PriorityQueue()
-    routes.put(Route([(0, 0)], grid))
-
-    while routes.qsize():
-        route = routes.get()
-
-        if route.is_complete:
-            return route
-
-        if route.end in seen:
+    def risks(self) -> list[int]:
+        """Risk of every position, indexed by y * (max_x + 1) + x"""
+        return [
+            self.get_risk(x, y)
+            for y in range(self.max_y + 1)
+            for x in range(self.max_x + 1)
+        ]
+
+
+def dijkstra(grid: Grid, target: int | None = None) -> tuple[list[float], array]:
+    """
+    Lowest total risk from the top left to every position, over flat indices
+
+    :param target: index to stop at once its risk is known
+    :return: risk of reaching each index, and the index each was reached from
+        (-1 for the start and anything unreached)
+    """
+    width = grid.max_x + 1
+    risks = grid.risks()
+    size = len(risks)
+    distances = [math.inf] * size
+    previous = array("l", [-1]) * size
+    distances[0] = 0
+    heap = [(0, 0)]
+    while heap:
+        distance, index = heapq.heappop(heap)
+        if index == target:
+            break
+        if distance > distances[index]:
             continue
-        seen.add(route.end)
-
-        for next_route in route.neighbours:
-            if next_route.end in seen:
+        column = index % width
+        for neighbour in (
+            index - width if index >= width else -1,
+            index + width if index + width < size else -1,
+            index - 1 if column else -1,
+            index + 1 if column + 1 < width else -1,
+        ):
+            if neighbour < 0:
                 continue
-            routes.put(next_route)
+            risk = distance + risks[neighbour]
+            if risk < distances[neighbour]:
+                distances[neighbour] = risk
+                previous[neighbour] = index
+                heapq.heappush(heap, (risk, neighbour))
+    return distances, previous
+
+
+def pathfind(grid: Grid) -> Route:
+    width = grid.max_x + 1
+    target = grid.max_y * width + grid.max_x
+    _, previous = dijkstra(grid, target)
+    nodes = []
+    index = target
+    while index != -1:
+        nodes.append((index % width, index // width))
+        index = previous[index]
+    return Route(nodes[::-1], grid)
 
 
 def main():
@@ -2,20 +2,16 @@ from __future__ import annotations
 
 import heapq
 import logging
-from dataclasses import dataclass
+import time
+from dataclasses import dataclass, field
 from enum import Enum
 from functools import cache, total_ordering, cached_property
 from pathlib import Path
-from typing import Iterator
+from typing import Iterable, Iterator, NamedTuple
 
 from profiling import profile
 
-
-def rindex(lst, value):
-    lst.reverse()
-    i = lst.index(value)
-    lst.reverse()
-    return len(lst) - i - 1
+LOGGER = logging.getLogger("amphipods")
 
 
 class Amphipod(str, Enum):
@@ -23,6 +19,10 @@ class Amphipod(str, Enum):
     B = "B", 1
     C = "C", 2
     D = "D", 3
+    # only needed for burrows with more than 4 rooms
+    E = "E", 4
+    F = "F", 5
+    G = "G", 6
 
     def __new__(cls, value, energy_pow):
         obj = str.__new__(cls, value)
@@ -43,13 +43,18 @@ class Amphipod(str, Enum):
         raise KeyError(room_idx)
 
 
+CELL_BITS = 3
+CELL_MASK = (1 << CELL_BITS) - 1
+ENERGY = [0] + [pod.energy for pod in Amphipod]
+"""Energy per step, by cell value"""
+
+
 @total_ordering
 @dataclass
 class State:
     hallway: list[Amphipod | None]
     rooms: list[list[Amphipod | None]]
     cost: int = 0
-    prev_state: State | None = None
 
     def __repr__(self):
         lines = [
@@ -72,86 +77,47 @@ class State:
         return self.priority < other.priority
 
     def __hash__(self):
-        if not (obj_hash := getattr(self, "_hash", None)):
-            hallway = sum(
-                i * hash(c)
-                for i, c in enumerate(self.hallway, start=1)
-                if c is not None
-            )
-            rooms = sum(
-                i * sum(j * hash(pod) for j, pod in enumerate(room, start=1))
-                for i, room in enumerate(self.rooms, start=1)
-            )
-            obj_hash = hallway + rooms + self.cost
-            setattr(self, "_hash", obj_hash)
-        return obj_hash
-
-    def transitions(self) -> Iterator[State]:
-        yield from self._room_to_hallway_transitions()
-        yield from self._hallway_to_room_transitions()
-
-    def _iter_empty_spaces(self, start: int) -> Iterator[int]:
-        for i in range(start, -1, -1):
-            if self.hallway[i] is not None:
-                break
-            yield i
-        for i in range(start + 1, len(self.hallway)):
-            if self.hallway[i] is not None:
-                break
-            yield i
-
-    def _room_to_hallway_transitions(self) -> Iterator[State]:
-        for room_idx, room in enumerate(self.rooms):
-            if not self.is_room_exitable(room_idx):
-                continue
+        return hash((self.key, self.cost))
 
-            depth, pod = None, None
-            for depth, pod in enumerate(room):
-                if pod is not None:
-                    break
-            if pod is None and depth is None:
-                return
-
-            current_pos = self._room_pos(room_idx)
-
-            for target_pos in self._iter_empty_spaces(current_pos):
-                if self.is_above_room(target_pos):
-                    continue
-
-                steps = depth + 1 + abs(current_pos - target_pos)
-                cost = steps * pod.energy
-
-                new_state = self.copy()
-                new_state.hallway[target_pos] = pod
-                new_state.rooms[room_idx][depth] = None
-                new_state.cost += cost
-                yield new_state
-
-    def _hallway_to_room_transitions(self) -> Iterator[State]:
-        for current_pos, pod in enumerate(self.hallway):
-            if pod is None:
-                continue
-            if not self.is_room_enterable(pod.target_room_idx):
-                continue
+    @cached_property
+    def key(self) -> int:
+        """
+        Positions of every amphipod packed into an int, CELL_BITS per cell
+        for the hallway then each room from the top down. Empty cells are 0,
+        amphipods are their target room index + 1.
+        """
+        key = 0
+        cells = [*self.hallway, *(pod for room in self.rooms for pod in room)]
+        for pod in reversed(cells):
+            key = (key << CELL_BITS) | (0 if pod is None else pod.target_room_idx + 1)
+        return key
 
-            target_x = self._room_pos(pod.target_room_idx)
-            if not self.is_hallway_clear(current_pos, target_x):
-                continue
+    @classmethod
+    def from_key(
+        cls, key: int, hallway_length: int, room_count: int, depth: int, cost: int = 0
+    ) -> State:
+        cells = []
+        for _ in range(hallway_length + room_count * depth):
+            code = key & CELL_MASK
+            cells.append(None if code == 0 else Amphipod.from_room_idx(code - 1))
+            key >>= CELL_BITS
+        rooms = [
+            cells[hallway_length + i * depth : hallway_length + (i + 1) * depth]
+            for i in range(room_count)
+        ]
+        return cls(cells[:hallway_length], rooms, cost)
 
-            target_room_depth = rindex(self.rooms[pod.target_room_idx], None)
-            steps = abs(target_x - current_pos) + 1 + target_room_depth
-            cost = steps * pod.energy
+    @property
+    def burrow(self) -> Burrow:
+        return Burrow.of(len(self.hallway), len(self.rooms), len(self.rooms[0]))
 
-            new_state = self.copy()
-            new_state.hallway[current_pos] = None
-            new_state.rooms[pod.target_room_idx][target_room_depth] = pod
-            new_state.cost += cost
-            yield new_state
+    def transitions(self) -> Iterator[State]:
+        burrow = self.burrow
+        for key, cost in burrow.moves(self.key):
+            yield burrow.decode(key, self.cost + cost)
 
     def copy(self) -> State:
-        s = State(self.hallway.copy(), [r.copy() for r in self.rooms], self.cost)
-        # s.prev_state = self
-        return s
+        return State(self.hallway.copy(), [r.copy() for r in self.rooms], self.cost)
 
     @property
     def is_complete(self) -> bool:
@@ -163,6 +129,10 @@ class State:
 
     @cached_property
     def priority(self) -> int:
+        """
+        The original search estimate, the search now uses Burrow.heuristic.
+        Kept so SearchStats.check_heuristics can compare the two.
+        """
         return (
             self.cost
             + self._cost_exit_room()
@@ -214,27 +184,233 @@ class State:
     def _room_pos(room_idx: int) -> int:
         return 2 + (room_idx * 2)
 
-    def is_room_enterable(self, room_idx: int) -> bool:
-        return all(
-            True if pod is None else pod.target_room_idx == room_idx
-            for pod in self.rooms[room_idx]
-        )
 
-    def is_room_exitable(self, room_idx: int) -> bool:
-        return not self.is_room_enterable(room_idx)
+class Move(NamedTuple):
+    pod: Amphipod
+    source: int
+    """Cell moved from, numbered as in State.key"""
+    target: int
+    cost: int
+
+
+class RoomSummary(NamedTuple):
+    entry: int | None
+    """Depth an amphipod entering the room moves to, None if it can't be entered"""
+    exit: tuple[int, int] | None
+    """(depth, cell value) of the amphipod that can leave, None if none need to"""
+    cost: int
+    """Heuristic cost of the amphipods in the room"""
+
+
+@dataclass(frozen=True)
+class Burrow:
+    """
+    Geometry of a burrow, with the steps and blocking cells of every move
+    precomputed so moves can be made on State.key values directly
+
+    Cells are numbered as in State.key, the hallway then each room from the
+    top down. A move is blocked if any cell in its mask is occupied, masks
+    use the lowest bit of each cell so they can be checked against
+    occupied(key) with a single AND.
+    """
+
+    hallway_length: int
+    room_positions: tuple[int, ...]
+    depth: int
 
+    @classmethod
     @cache
-    def is_above_room(self, pos: int) -> bool:
-        return (pos - 2) % 2 == 0 and (pos - 2) / 2 < len(self.rooms)
-
-    def is_hallway_clear(self, start: int, target: int) -> bool:
-        if start == target:
-            return True
-        if start < target:
-            start, end = start + 1, target
+    def of(cls, hallway_length: int, room_count: int, depth: int) -> Burrow:
+        """Burrow with rooms below every other hallway cell, from the third"""
+        positions = tuple(State._room_pos(i) for i in range(room_count))
+        return cls(hallway_length, positions, depth)
+
+    def cell(self, room_idx: int, depth: int) -> int:
+        return self.hallway_length + room_idx * self.depth + depth
+
+    def describe(self, cell: int) -> str:
+        if cell < self.hallway_length:
+            return f"hallway {cell}"
+        room_idx, depth = divmod(cell - self.hallway_length, self.depth)
+        return f"room {Amphipod.from_room_idx(room_idx).value} depth {depth}"
+
+    def move(self, before: int, after: int) -> Move:
+        """The single move that takes key before to key after"""
+        source = target = None
+        cell, changed = 0, before ^ after
+        while changed:
+            if changed & CELL_MASK:
+                if (after >> (cell * CELL_BITS)) & CELL_MASK:
+                    target = cell
+                else:
+                    source = cell
+            changed >>= CELL_BITS
+            cell += 1
+        pod = (before >> (source * CELL_BITS)) & CELL_MASK
+        hallway, room = sorted((source, target))
+        room_idx, depth = divmod(room - self.hallway_length, self.depth)
+        steps = self._steps(room_idx, depth, hallway)
+        pod_type = Amphipod.from_room_idx(pod - 1)
+        return Move(pod_type, source, target, steps * ENERGY[pod])
+
+    @staticmethod
+    def _bit(cell: int) -> int:
+        return 1 << (cell * CELL_BITS)
+
+    @cached_property
+    def _low_bits(self) -> int:
+        cells = self.hallway_length + len(self.room_positions) * self.depth
+        return sum(self._bit(c) for c in range(cells))
+
+    @cached_property
+    def stops(self) -> tuple[int, ...]:
+        """Hallway cells an amphipod can stop in"""
+        return tuple(
+            h for h in range(self.hallway_length) if h not in self.room_positions
+        )
+
+    def _path_mask(self, room_idx: int, depth: int, hallway_pos: int) -> int:
+        """Cells between a room slot and a hallway cell, excluding both ends"""
+        entrance = self.room_positions[room_idx]
+        if hallway_pos < entrance:
+            hallway = range(hallway_pos + 1, entrance + 1)
+        else:
+            hallway = range(entrance, hallway_pos)
+        mask = sum(self._bit(h) for h in hallway)
+        return mask + sum(self._bit(self.cell(room_idx, d)) for d in range(depth))
+
+    def _steps(self, room_idx: int, depth: int, hallway_pos: int) -> int:
+        return depth + 1 + abs(self.room_positions[room_idx] - hallway_pos)
+
+    @cached_property
+    def _exits(self) -> list[list[list[tuple[int, int, int]]]]:
+        """[room][depth] -> (hallway cell, steps, mask) for every stop"""
+        return [
+            [
+                [
+                    (h, self._steps(r, d, h), self._path_mask(r, d, h) | self._bit(h))
+                    for h in self.stops
+                ]
+                for d in range(self.depth)
+            ]
+            for r in range(len(self.room_positions))
+        ]
+
+    @cached_property
+    def _entries(self) -> list[list[list[tuple[int, int]]]]:
+        """[hallway cell][room][depth] -> (steps, mask)"""
+        return [
+            [
+                [
+                    (self._steps(r, d, h), self._path_mask(r, d, h))
+                    for d in range(self.depth)
+                ]
+                for r in range(len(self.room_positions))
+            ]
+            for h in range(self.hallway_length)
+        ]
+
+    @cached_property
+    def goal(self) -> int:
+        """Key of the burrow with every amphipod in its room"""
+        key = 0
+        for r in range(len(self.room_positions)):
+            for d in range(self.depth):
+                key |= (r + 1) << (self.cell(r, d) * CELL_BITS)
+        return key
+
+    def occupied(self, key: int) -> int:
+        return (key | key >> 1 | key >> 2) & self._low_bits
+
+    @cached_property
+    def _room_summaries(self) -> list[dict[int, RoomSummary]]:
+        return [{} for _ in self.room_positions]
+
+    def _room(self, key: int, room_idx: int) -> RoomSummary:
+        shift = self.cell(room_idx, 0) * CELL_BITS
+        field = (key >> shift) & ((1 << (self.depth * CELL_BITS)) - 1)
+        summaries = self._room_summaries[room_idx]
+        if (summary := summaries.get(field)) is None:
+            summary = summaries[field] = self._summarise(room_idx, field)
+        return summary
+
+    def _summarise(self, room_idx: int, field: int) -> RoomSummary:
+        pods = [(field >> (d * CELL_BITS)) & CELL_MASK for d in range(self.depth)]
+        own = room_idx + 1
+        entry = None
+        if all(p in (0, own) for p in pods):
+            if 0 in pods:
+                entry = self.depth - 1 - pods[::-1].index(0)
+            exit_ = None
         else:
-            start, end = target, start
-        return all(i is None for i in self.hallway[start:end])
+            depth = next(d for d, p in enumerate(pods) if p)
+            exit_ = depth, pods[depth]
+
+        cost = 0
+        settled = True
+        missing = self.depth
+        for depth in range(self.depth - 1, -1, -1):
+            if not (pod := pods[depth]):
+                continue
+            if settled and pod == own:
+                missing -= 1
+                continue
+            settled = False
+            # an amphipod blocking its own room has to step out and back in
+            hallway_steps = max(
+                abs(self.room_positions[room_idx] - self.room_positions[pod - 1]), 2
+            )
+            cost += (depth + 1 + hallway_steps + 1) * ENERGY[pod]
+        cost += ENERGY[own] * missing * (missing - 1) // 2
+        return RoomSummary(entry, exit_, cost)
+
+    def moves(self, key: int) -> Iterator[tuple[int, int]]:
+        """Keys reachable in one move, with the energy each move costs"""
+        occupied = self.occupied(key)
+        # moving an amphipod into its room is never worse than any other move
+        for h in self.stops:
+            if not (pod := (key >> (h * CELL_BITS)) & CELL_MASK):
+                continue
+            if (depth := self._room(key, pod - 1).entry) is None:
+                continue
+            steps, mask = self._entries[h][pod - 1][depth]
+            if occupied & mask:
+                continue
+            target = self.cell(pod - 1, depth)
+            yield (
+                key - (pod << (h * CELL_BITS)) + (pod << (target * CELL_BITS)),
+                steps * ENERGY[pod],
+            )
+            return
+
+        for room_idx in range(len(self.room_positions)):
+            if (exit_ := self._room(key, room_idx).exit) is None:
+                continue
+            depth, pod = exit_
+            removed = key - (pod << (self.cell(room_idx, depth) * CELL_BITS))
+            for h, steps, mask in self._exits[room_idx][depth]:
+                if not occupied & mask:
+                    yield removed + (pod << (h * CELL_BITS)), steps * ENERGY[pod]
+
+    def heuristic(self, key: int) -> int:
+        """
+        Lower bound on the energy left to spend: every amphipod that isn't
+        settled (in its room with only its own kind below) moves to the top
+        of its room, then each room is filled from the top down
+        """
+        cost = 0
+        for h in range(self.hallway_length):
+            if pod := (key >> (h * CELL_BITS)) & CELL_MASK:
+                steps = abs(h - self.room_positions[pod - 1]) + 1
+                cost += steps * ENERGY[pod]
+        for room_idx in range(len(self.room_positions)):
+            cost += self._room(key, room_idx).cost
+        return cost
+
+    def decode(self, key: int, cost: int = 0) -> State:
+        return State.from_key(
+            key, self.hallway_length, len(self.room_positions), self.depth, cost
+        )
 
 
 def load_state(contents: str) -> State:
@@ -251,37 +427,171 @@ def load_state(contents: str) -> State:
     return State(hallway, rooms)
 
 
+@dataclass
+class SearchStats:
+    pushed: int = 0
+    popped: int = 0
+    stale: int = 0
+    """Popped entries skipped because their key was since reached more cheaply"""
+    peak_heap: int = 0
+    duration: float = 0.0
+    """Search time / s"""
+    root_priority: int = 0
+    optimal_cost: int | None = None
+    samples: int = 0
+    """Number of states the heuristics were checked on"""
+    overestimates: list[tuple[str, int, int]] = field(default_factory=list)
+    """(heuristic, estimate, true remaining cost) where a heuristic overestimated"""
+
+    @property
+    def expanded(self) -> int:
+        return self.popped - self.stale
+
+    @property
+    def expansions_per_second(self) -> float:
+        return self.expanded / self.duration if self.duration else 0.0
+
+    @property
+    def root_gap(self) -> int | None:
+        """Root priority minus the optimal cost, never above 0 if admissible"""
+        if self.optimal_cost is None:
+            return None
+        return self.root_priority - self.optimal_cost
+
+    @property
+    def admissible(self) -> bool:
+        return not self.overestimates
+
+    def check_heuristics(self, solution: Solution, samples: int) -> None:
+        """
+        Compare the search heuristic and the State._cost_* terms against the
+        true remaining cost, for up to samples states along the optimal path
+        """
+        states = solution.states()
+        step = max(1, len(states) // samples) if samples else len(states) + 1
+        for state in states[::step][:samples]:
+            remaining = solution.cost - state.cost
+            estimates = {
+                "burrow": solution.burrow.heuristic(state.key),
+                "state": state.priority - state.cost,
+            }
+            for name, estimate in estimates.items():
+                if estimate > remaining:
+                    self.overestimates.append((name, estimate, remaining))
+            self.samples += 1
+
+    def __str__(self) -> str:
+        return (
+            f"pushed={self.pushed} popped={self.popped} stale={self.stale} "
+            f"peak_heap={self.peak_heap} "
+            f"expansions/s={self.expansions_per_second:,.0f} "
+            f"root_gap={self.root_gap} "
+            f"overestimates={len(self.overestimates)}/{self.samples}"
+        )
+
+
+@dataclass
+class Solution:
+    state: State
+    """Final state"""
+    burrow: Burrow
+    parents: dict[int, int]
+    """Key each key was best reached from, the initial key has no entry"""
+    stats: SearchStats = field(default_factory=SearchStats)
+
+    @property
+    def cost(self) -> int:
+        return self.state.cost
+
+    def keys(self) -> list[int]:
+        """Keys from the initial state to the final state"""
+        keys = [self.state.key]
+        while (parent := self.parents.get(keys[-1])) is not None:
+            keys.append(parent)
+        return keys[::-1]
+
+    def moves(self) -> list[Move]:
+        keys = self.keys()
+        return [self.burrow.move(a, b) for a, b in zip(keys, keys[1:])]
+
+    def states(self) -> list[State]:
+        keys = self.keys()
+        moves = self.moves()
+        cost = self.cost - sum(move.cost for move in moves)
+        states = [self.burrow.decode(keys[0], cost)]
+        for key, move in zip(keys[1:], moves):
+            cost += move.cost
+            states.append(self.burrow.decode(key, cost))
+        return states
+
+
 @profile(logging.WARNING)
-def solve(initial_state: State) -> State:
-    stack = [initial_state]
-    while stack:
-        state = heapq.heappop(stack)
-        if state.is_complete:
-            return state
-        for next_state in state.transitions():
-            heapq.heappush(stack, next_state)
+def solve(initial_state: State, heuristic_samples: int = 16) -> Solution | None:
+    """
+    A* search for the cheapest way to sort the amphipods
+
+    :param heuristic_samples: states on the solution path to check the
+        heuristics against, see SearchStats.check_heuristics
+    """
+    burrow = initial_state.burrow
+    start = initial_state.key
+    stats = SearchStats()
+    started = time.perf_counter()
+    # lowest cost each position has been reached with, any heap entry with a
+    # higher cost has been superseded
+    best_cost = {start: initial_state.cost}
+    # only the predecessor key is kept, the move is recovered from the two keys
+    parents: dict[int, int] = {}
+    stats.root_priority = initial_state.cost + burrow.heuristic(start)
+    heap = [(stats.root_priority, initial_state.cost, start)]
+    stats.pushed = stats.peak_heap = 1
+    while heap:
+        _, cost, key = heapq.heappop(heap)
+        stats.popped += 1
+        if cost > best_cost[key]:
+            stats.stale += 1
+            continue
+        if key == burrow.goal:
+            stats.duration = time.perf_counter() - started
+            stats.optimal_cost = cost
+            solution = Solution(burrow.decode(key, cost), burrow, parents, stats)
+            stats.check_heuristics(solution, heuristic_samples)
+            LOGGER.debug("search stats: %s", stats)
+            return solution
+        for next_key, move_cost in burrow.moves(key):
+            next_cost = cost + move_cost
+            if next_key not in best_cost or next_cost < best_cost[next_key]:
+                best_cost[next_key] = next_cost
+                parents[next_key] = key
+                priority = next_cost + burrow.heuristic(next_key)
+                heapq.heappush(heap, (priority, next_cost, next_key))
+                stats.pushed += 1
+        if len(heap) > stats.peak_heap:
+            stats.peak_heap = len(heap)
+    return None
+
+
+def unfold(state: State, rows: Iterable[str], at: int = 1) -> State:
+    """Insert rows of amphipods, one letter per room, into every room at a depth"""
+    state = state.copy()
+    for offset, row in enumerate(rows):
+        for room, pod in zip(state.rooms, row):
+            room.insert(at + offset, Amphipod(pod))
+    return state
 
 
 def p2_state(initial_state: State) -> State:
-    new_pods = {
-        1: [Amphipod.D, Amphipod.C, Amphipod.B, Amphipod.A],
-        2: [Amphipod.D, Amphipod.B, Amphipod.A, Amphipod.C],
-    }
-    state = initial_state.copy()
-    for insert, pods in new_pods.items():
-        for i, pod in enumerate(pods):
-            state.rooms[i].insert(insert, Amphipod(pod))
-    return state
+    return unfold(initial_state, ["DCBA", "DBAC"])
 
 
-def print_solution(final_state: State):
-    states = [final_state]
-    state = final_state
-    while state.prev_state is not None:
-        states.append(state.prev_state)
-        state = state.prev_state
-    for i, state in enumerate(list(reversed(states))):
-        print(f"{i}: ")
+def print_solution(solution: Solution):
+    states = solution.states()
+    print("0: ")
+    print(states[0])
+    for i, (move, state) in enumerate(zip(solution.moves(), states[1:]), start=1):
+        source = solution.burrow.describe(move.source)
+        target = solution.burrow.describe(move.target)
+        print(f"{i}: {move.pod.value} {source} -> {target} ({move.cost})")
         print(state)
 
 
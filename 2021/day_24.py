@@ -3,8 +3,16 @@ from __future__ import annotations
 import logging
 import re
 from abc import abstractmethod, ABC
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from typing import Iterable, Iterator
+from typing import Callable, Iterable, Iterator, NamedTuple, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    # only needed for batch evaluation
+    np = None
 
 LOGGER = logging.getLogger("alu")
 
@@ -86,6 +94,95 @@ class Eql(Operation):
         alu[self[0]] = int(self.arg(alu, 0) == self.arg(alu, 1))
 
 
+ALUFunction = Callable[[Sequence[int]], Tuple[int, int, int, int]]
+BatchFunction = Callable[["np.ndarray"], "np.ndarray"]
+
+_SOURCE: dict[type[Operation], str] = {
+    Inp: "{a} = inputs[{input}]",
+    Add: "{a} += {b}",
+    Mul: "{a} *= {b}",
+    Div: "{a} //= {b}",
+    Mod: "{a} %= {b}",
+    Eql: "{a} = 1 if {a} == {b} else 0",
+}
+
+# registers may start as the int 0 or share memory with the inputs, so never
+# update arrays in place
+_BATCH_SOURCE: dict[type[Operation], str] = {
+    Inp: "{a} = inputs[:, {input}]",
+    Add: "{a} = {a} + {b}",
+    Mul: "{a} = {a} * {b}",
+    Div: "{a} = {a} // {b}",
+    Mod: "{a} = {a} % {b}",
+    Eql: "{a} = np.equal({a}, {b}).astype(np.int64)",
+}
+
+
+def _generate(
+    instructions: Iterable[str],
+    source: dict[type[Operation], str],
+    registers: str = "w = x = y = z = 0",
+) -> list[str]:
+    """Body lines for a compiled program, skipping instructions with no effect"""
+    lines = [f"    {registers}"]
+    inputs = 0
+    for instruction in instructions:
+        operation = ALUProgram._parse_instruction(instruction)
+        a, b = (list(operation.arguments) + [None])[:2]
+        if isinstance(operation, Mul) and b == 0:
+            lines.append(f"    {a} = 0")
+            continue
+        if (isinstance(operation, (Mul, Div)) and b == 1) or (
+            isinstance(operation, Add) and b == 0
+        ):
+            continue
+        lines.append("    " + source[type(operation)].format(a=a, b=b, input=inputs))
+        if isinstance(operation, Inp):
+            inputs += 1
+    return lines
+
+
+def _define(lines: list[str], name: str, namespace: dict) -> Callable:
+    exec(compile("\n".join(lines), f"<{name}>", "exec"), namespace)
+    return namespace[name]
+
+
+@lru_cache(maxsize=None)
+def compile_program(instructions: tuple[str, ...]) -> ALUFunction:
+    """
+    Compile instructions into a function of the inputs, returning (w, x, y, z)
+
+    Registers are local variables and input positions are fixed at compile
+    time, so a run is a single call with no parsing or dispatch.
+    """
+    lines = ["def alu(inputs):"]
+    lines += _generate(instructions, _SOURCE)
+    lines.append("    return w, x, y, z")
+    return _define(lines, "alu", {})
+
+
+@lru_cache(maxsize=None)
+def compile_batch_program(instructions: tuple[str, ...]) -> BatchFunction:
+    """
+    Compile instructions into a function over a 2D array of inputs, one row
+    per run, returning the z register of every run
+    """
+    if np is None:
+        raise RuntimeError("batch evaluation requires numpy")
+    lines = ["def alu_batch(inputs):"]
+    lines += _generate(instructions, _BATCH_SOURCE)
+    lines.append("    return np.zeros(len(inputs), dtype=np.int64) + z")
+    return _define(lines, "alu_batch", {"np": np})
+
+
+def model_digits(numbers: Sequence[int] | "np.ndarray") -> "np.ndarray":
+    """Split 14 digit model numbers into a (len(numbers), 14) array of digits"""
+    if np is None:
+        raise RuntimeError("batch evaluation requires numpy")
+    numbers = np.asarray(numbers, dtype=np.int64)
+    return numbers[:, np.newaxis] // 10 ** np.arange(13, -1, -1, dtype=np.int64) % 10
+
+
 class ALUProgram(ALU):
     INSTRUCTION_REGEX = re.compile(
         r"(?P<OP>[a-z]{3}) (?P<A>[wxyz]|-?\d+)(?: (?P<B>[wxyz]|-?\d+))?"
@@ -133,8 +230,17 @@ class ALUProgram(ALU):
             self.ip += 1
         self.halted = True
 
-    def _parse_instruction(self, instruction: str) -> Operation:
-        if not (matches := self.INSTRUCTION_REGEX.match(instruction)):
+    def compile(self) -> ALUFunction:
+        return compile_program(tuple(i.strip() for i in self.instructions))
+
+    def run_batch(self, inputs: "np.ndarray") -> "np.ndarray":
+        """z register after running the program on each row of inputs"""
+        program = compile_batch_program(tuple(i.strip() for i in self.instructions))
+        return program(np.asarray(inputs, dtype=np.int64))
+
+    @classmethod
+    def _parse_instruction(cls, instruction: str) -> Operation:
+        if not (matches := cls.INSTRUCTION_REGEX.match(instruction)):
             raise RuntimeError("invalid instruction", instruction)
         op = matches["OP"]
         args = []
@@ -154,6 +260,7 @@ class ALUProgram(ALU):
 class ModelValidatingALUProgram(ALUProgram):
     def __init__(self, instructions: Iterable[str], model_number: int = 0):
         super().__init__(instructions)
+        self._alu = self.compile()
         self.model_number = model_number
         self.set_model_number(model_number)
 
@@ -161,6 +268,335 @@ class ModelValidatingALUProgram(ALUProgram):
         self.model_number = number
         self._inputs = [int(i) for i in f"{number:0>14}"]
 
+    def run(self):
+        """Run the compiled program over the model number's digits"""
+        self.update(zip("wxyz", self._alu(self._inputs)))
+        self.ip = len(self.instructions)
+        self._inp_p = len(self._inputs)
+        self.halted = True
+
+    def is_valid(self, number: int) -> bool:
+        return self._alu([int(i) for i in f"{number:0>14}"])[3] == 0
+
+    def evaluate_batch(self, numbers: Sequence[int] | "np.ndarray") -> "np.ndarray":
+        """z register for every model number, a model number is valid if it is 0"""
+        return self.run_batch(model_digits(numbers))
+
+
+BlockFunction = Callable[[int, Sequence[int]], int]
+
+
+def split_blocks(instructions: Iterable[str]) -> list[tuple[str, ...]]:
+    """
+    Split a MONAD program into its per digit blocks
+
+    Each block starts at an inp and may only carry z over from the previous
+    block, every other register must be written before it's read (or still be
+    0 in the first block).
+    """
+    blocks: list[list[str]] = []
+    for instruction in (i.strip() for i in instructions):
+        if not instruction:
+            continue
+        operation = ALUProgram._parse_instruction(instruction)
+        if isinstance(operation, Inp):
+            blocks.append([])
+        elif not blocks:
+            raise ValueError("program doesn't start with inp", instruction)
+        blocks[-1].append(instruction)
+
+    for index, block in enumerate(blocks):
+        # registers all start at 0, which is what compile_block assumes
+        written = {"z"} if index else {"w", "x", "y", "z"}
+        for instruction in block:
+            operation = ALUProgram._parse_instruction(instruction)
+            a, b = (list(operation.arguments) + [None])[:2]
+            reads = [b] if isinstance(b, str) else []
+            if not isinstance(operation, Inp) and not (
+                isinstance(operation, Mul) and b == 0
+            ):
+                reads.append(a)
+            if any(r not in written for r in reads):
+                raise ValueError("block reads a register from the last block", block)
+            written.add(a)
+    return [tuple(block) for block in blocks]
+
+
+@lru_cache(maxsize=None)
+def compile_block(instructions: tuple[str, ...]) -> BlockFunction:
+    """Compile a block into a function of the incoming z and its input, returning z"""
+    lines = ["def block(z, inputs):"]
+    lines += _generate(instructions, _SOURCE, registers="w = x = y = 0")
+    lines.append("    return z")
+    return _define(lines, "block", {})
+
+
+def solve_model_numbers(instructions: Iterable[str]) -> tuple[int, int]:
+    """
+    Largest and smallest valid model numbers for a MONAD program
+
+    Digits are chosen one block at a time, remembering every (block, z) that
+    can't reach z == 0. z acts as a base 26 stack that only shrinks when a
+    block divides it, so once z is too big for the remaining blocks to pop
+    back to 0 the branch is pruned.
+    """
+    blocks = split_blocks(instructions)
+    functions = [compile_block(block) for block in blocks]
+    bounds = _stack_bounds(blocks)
+    dead: set[tuple[int, int]] = set()
+
+    def search(index: int, z: int, digits: range) -> list[int] | None:
+        if index == len(blocks):
+            return [] if z == 0 else None
+        if z >= bounds[index] or (index, z) in dead:
+            return None
+        for digit in digits:
+            rest = search(index + 1, functions[index](z, (digit,)), digits)
+            if rest is not None:
+                return [digit] + rest
+        dead.add((index, z))
+        return None
+
+    largest = search(0, 0, range(9, 0, -1))
+    smallest = search(0, 0, range(1, 10))
+    if largest is None or smallest is None:
+        raise ValueError("no valid model number")
+    return (
+        int("".join(str(d) for d in largest)),
+        int("".join(str(d) for d in smallest)),
+    )
+
+
+INFINITY = float("inf")
+
+
+class Interval(NamedTuple):
+    """Inclusive range of values a register can hold, bounds may be infinite"""
+
+    low: float
+    high: float
+
+    @property
+    def constant(self) -> int | None:
+        if self.low == self.high and abs(self.low) != INFINITY:
+            return int(self.low)
+        return None
+
+    def disjoint(self, other: Interval) -> bool:
+        return self.high < other.low or other.high < self.low
+
+
+UNBOUNDED = Interval(-INFINITY, INFINITY)
+
+
+def _product(a: float, b: float) -> float:
+    # avoid 0 * inf, which is nan
+    return 0 if a == 0 or b == 0 else a * b
+
+
+def _floor_divide(a: float, b: int) -> float:
+    if a in (INFINITY, -INFINITY):
+        return a if b > 0 else -a
+    return a // b
+
+
+def _evaluate(op: type[Operation], a: Interval, b: Interval) -> Interval:
+    """Interval of op applied to registers holding a and b"""
+    if op is Add:
+        return Interval(a.low + b.low, a.high + b.high)
+    if op is Mul:
+        products = [_product(i, j) for i in a for j in b]
+        return Interval(min(products), max(products))
+    if op is Div:
+        if (divisor := b.constant) is None or divisor == 0:
+            return UNBOUNDED
+        bounds = [_floor_divide(a.low, divisor), _floor_divide(a.high, divisor)]
+        return Interval(min(bounds), max(bounds))
+    if op is Mod:
+        if (divisor := b.constant) is None or divisor <= 0:
+            return UNBOUNDED
+        if a.low >= 0 and a.high < divisor:
+            return a
+        return Interval(0, divisor - 1)
+    if op is Eql:
+        if a.constant is not None and a.constant == b.constant:
+            return Interval(1, 1)
+        if a.disjoint(b):
+            return Interval(0, 0)
+        return Interval(0, 1)
+    raise ValueError("can't evaluate operation", op)
+
+
+@dataclass
+class Analysis:
+    instructions: list[str]
+    """Equivalent program with constants folded and dead instructions removed"""
+    z: Interval
+    """Possible values of z at the end of the program"""
+    constraints: list[frozenset[int]] | None
+    """
+    Values of each input that appear in some run ending with z == 0, None if the
+    program can't be split into MONAD blocks
+    """
+
+
+def _is_identity(op: type[Operation], b: int | str) -> bool:
+    return (op is Add and b == 0) or (op in (Mul, Div) and b == 1)
+
+
+def fold_constants(
+    instructions: Iterable[str], input_range: Interval = Interval(1, 9)
+) -> tuple[list[str], Interval]:
+    """
+    Propagate register intervals through the program, replacing operands that
+    are known with their value and dropping instructions whose result is
+    known. Comparisons against values a register can't hold (e.g. a digit
+    against 10 or more) become constants. Known values are only written to a
+    register when an instruction needs to read it, or at the end.
+
+    :return: the rewritten program and the final interval of z
+    """
+    registers = {r: Interval(0, 0) for r in "wxyz"}
+    # constant each register actually holds in the rewritten program
+    written: dict[str, int | None] = {r: 0 for r in "wxyz"}
+    folded = []
+
+    def materialise(register: str) -> None:
+        value = registers[register].constant
+        if value is None or written[register] == value:
+            return
+        folded.append(f"mul {register} 0")
+        if value:
+            folded.append(f"add {register} {value}")
+        written[register] = value
+
+    for instruction in (i.strip() for i in instructions):
+        if not instruction:
+            continue
+        operation = ALUProgram._parse_instruction(instruction)
+        op = type(operation)
+        a, b = (list(operation.arguments) + [None])[:2]
+        if op is Inp:
+            registers[a] = input_range
+            written[a] = None
+            folded.append(instruction)
+            continue
+
+        if isinstance(b, str) and (value := registers[b].constant) is not None:
+            b = value
+        if _is_identity(op, b):
+            continue
+        operand = Interval(b, b) if isinstance(b, int) else registers[b]
+        result = _evaluate(op, registers[a], operand)
+        if result.constant is None:
+            materialise(a)
+            folded.append(f"{op.__name__.lower()} {a} {b}")
+            written[a] = None
+        registers[a] = result
+
+    for register in "wxyz":
+        materialise(register)
+    return folded, registers["z"]
+
+
+def remove_dead_code(instructions: Iterable[str], live: str = "z") -> list[str]:
+    """Drop instructions whose result is never read before the end of the program"""
+    live_registers = set(live)
+    kept = []
+    for instruction in reversed([i.strip() for i in instructions if i.strip()]):
+        operation = ALUProgram._parse_instruction(instruction)
+        a, b = (list(operation.arguments) + [None])[:2]
+        if isinstance(operation, Inp):
+            # still consumes an input
+            live_registers.discard(a)
+            kept.append(instruction)
+            continue
+        if a not in live_registers:
+            continue
+        if isinstance(operation, Mul) and b == 0:
+            live_registers.discard(a)
+        if isinstance(b, str):
+            live_registers.add(b)
+        kept.append(instruction)
+    return kept[::-1]
+
+
+def z_range(
+    instructions: Iterable[str], z: Interval, input_range: Interval = Interval(1, 9)
+) -> Interval:
+    """Interval of z after running instructions from z, other registers start at 0"""
+    registers = {"w": Interval(0, 0), "x": Interval(0, 0), "y": Interval(0, 0), "z": z}
+    for instruction in instructions:
+        operation = ALUProgram._parse_instruction(instruction)
+        a, b = (list(operation.arguments) + [None])[:2]
+        if isinstance(operation, Inp):
+            registers[a] = input_range
+            continue
+        operand = Interval(b, b) if isinstance(b, int) else registers[b]
+        registers[a] = _evaluate(type(operation), registers[a], operand)
+    return registers["z"]
+
+
+_Z_LIMIT = 1 << 62
+
+
+def _stack_bounds(blocks: list[tuple[str, ...]]) -> list[float]:
+    """
+    Smallest z at the start of each block from which z can no longer get back
+    to 0, using the interval of z each block produces from [bound, inf)
+    """
+    bounds: list[float] = [INFINITY] * len(blocks) + [1]
+    for i in range(len(blocks) - 1, -1, -1):
+        target = bounds[i + 1]
+        if z_range(blocks[i], Interval(_Z_LIMIT, INFINITY)).low < target:
+            continue
+        low, high = 0, _Z_LIMIT
+        while low < high:
+            middle = (low + high) // 2
+            if z_range(blocks[i], Interval(middle, INFINITY)).low >= target:
+                high = middle
+            else:
+                low = middle + 1
+        bounds[i] = low
+    return bounds
+
+
+def input_constraints(instructions: Iterable[str]) -> list[frozenset[int]]:
+    """Digits allowed at each position of a MONAD model number for z to reach 0"""
+    blocks = split_blocks(instructions)
+    functions = [compile_block(block) for block in blocks]
+    bounds = _stack_bounds(blocks)
+    allowed: list[set[int]] = [set() for _ in blocks]
+    reachable: dict[tuple[int, int], bool] = {}
+
+    def search(index: int, z: int) -> bool:
+        if index == len(blocks):
+            return z == 0
+        if z >= bounds[index]:
+            return False
+        if (index, z) not in reachable:
+            found = False
+            for digit in range(1, 10):
+                if search(index + 1, functions[index](z, (digit,))):
+                    allowed[index].add(digit)
+                    found = True
+            reachable[index, z] = found
+        return reachable[index, z]
+
+    search(0, 0)
+    return [frozenset(digits) for digits in allowed]
+
+
+def analyse(instructions: Iterable[str]) -> Analysis:
+    """Reduce the program to what's needed for z, and find the digits that can pass"""
+    folded, z = fold_constants(instructions)
+    reduced = remove_dead_code(folded)
+    try:
+        constraints = input_constraints(reduced)
+    except ValueError:
+        constraints = None
+    return Analysis(reduced, z, constraints)
+
 
 def part1(program: ModelValidatingALUProgram) -> int | None:
     program.reset()
@@ -172,13 +608,15 @@ def part1(program: ModelValidatingALUProgram) -> int | None:
 
 def main():
     with Path(__file__).parent.joinpath("day_24-input.txt").open("r") as input_f:
-        program = ModelValidatingALUProgram(input_f.readlines())
-    program.set_model_number(96299896449997)
+        instructions = input_f.readlines()
+    largest, smallest = solve_model_numbers(instructions)
+    program = ModelValidatingALUProgram(instructions)
+    program.set_model_number(largest)
     print("Part1: ", part1(program))
 
     program.reset()
-    program.set_model_number(31162141116841)
-    print("Part1: ", part1(program))
+    program.set_model_number(smallest)
+    print("Part2: ", part1(program))
 
 
 if __name__ == "__main__":
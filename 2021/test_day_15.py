@@ -0,0 +1,31 @@
+from pathlib import Path
+from unittest import TestCase
+
+from day_15 import Grid, dijkstra, pathfind
+
+
+def load_grid(name: str) -> Grid:
+    with Path(__file__).parent.joinpath(name).open("r") as f:
+        return Grid([[int(x) for x in line.strip()] for line in f.readlines()])
+
+
+class Day15Test(TestCase):
+    def test_pathfind(self):
+        grid = load_grid("day_15-example.txt")
+        route = pathfind(grid)
+        self.assertEqual(40, route.risk)
+        self.assertEqual((0, 0), route.nodes[0])
+        self.assertTrue(route.is_complete)
+        for (x1, y1), (x2, y2) in zip(route.nodes, route.nodes[1:]):
+            self.assertEqual(1, abs(x1 - x2) + abs(y1 - y2))
+
+    def test_pathfind_repeated(self):
+        grid = load_grid("day_15-example.txt")
+        grid.repeat = 5
+        self.assertEqual(315, pathfind(grid).risk)
+
+    def test_dijkstra(self):
+        grid = Grid([[1, 9], [1, 1]])
+        distances, previous = dijkstra(grid)
+        self.assertEqual([0, 9, 1, 2], distances)
+        self.assertEqual([-1, 0, 0, 2], list(previous))
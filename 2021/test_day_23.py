@@ -1,6 +1,16 @@
+from pathlib import Path
 from unittest import TestCase
+from unittest.mock import patch
 
-from day_23 import State, Amphipod, load_state
+from day_23 import (
+    Amphipod,
+    Burrow,
+    SearchStats,
+    State,
+    load_state,
+    solve,
+    unfold,
+)
 
 
 class Day23Test(TestCase):
@@ -55,50 +65,102 @@ class Day23Test(TestCase):
         )
         self.assertTrue(state.is_complete)
 
-    def test_is_room_enterable(self):
-        state = State(
-            [None] * 11,
-            [
-                [Amphipod.A, None],
-                [Amphipod.C, None],
-                [None, None],
-                [Amphipod.D, Amphipod.D],
-            ],
-            0,
+    def test_key(self):
+        state = load_state(
+            """\
+#############
+#.B.D.......#
+###.#.#C#D###
+  #A#B#C#A#  
+  #########  """
         )
-        self.assertTrue(state.is_room_enterable(0))
-        self.assertFalse(state.is_room_enterable(1))
-        self.assertTrue(state.is_room_enterable(2))
+        self.assertEqual(state, State.from_key(state.key, 11, 4, 2))
+        moved = next(state.transitions())
+        self.assertNotEqual(state.key, moved.key)
+        self.assertEqual(moved, State.from_key(moved.key, 11, 4, 2, moved.cost))
 
-    def test_is_hallway_clear(self):
+    def test_solve_example(self):
+        with Path(__file__).parent.joinpath("day_23-example.txt").open("r") as f:
+            state = load_state(f.read())
+        self.assertEqual(12521, solve(state).cost)
+
+    def test_burrow_moves(self):
+        burrow = Burrow.of(11, 4, 2)
+        self.assertEqual((0, 1, 3, 5, 7, 9, 10), burrow.stops)
+
+        state = load_state(
+            """\
+#############
+#...........#
+###B#C#B#D###
+  #A#D#C#A#  
+  #########  """
+        )
+        moves = list(burrow.moves(state.key))
+        self.assertEqual(4 * 7, len(moves))
+        self.assertIn(30, [cost for _, cost in moves])
+
+        # D's path home is blocked by C, which can go home
         state = State(
+            [None, None, None, None, None, Amphipod.D, None, Amphipod.C] + [None] * 3,
             [
-                None,
-                Amphipod.A,
-                None,
-                Amphipod.C,
-                None,
-                None,
-                None,
-                Amphipod.D,
-                None,
-                None,
-                Amphipod.D,
+                [Amphipod.A, Amphipod.A],
+                [Amphipod.B, Amphipod.B],
+                [None, Amphipod.C],
+                [None, Amphipod.D],
             ],
-            [],
-            0,
         )
-        self.assertTrue(state.is_hallway_clear(0, 0))
-        self.assertTrue(state.is_hallway_clear(1, 2))
-        self.assertTrue(state.is_hallway_clear(3, 6))
-        self.assertTrue(state.is_hallway_clear(10, 8))
+        [(key, cost)] = burrow.moves(state.key)
+        self.assertEqual(200, cost)
+        [(key, cost)] = burrow.moves(key)
+        self.assertEqual((burrow.goal, 4000), (key, cost))
 
+    def test_solve_wide_burrow(self):
         state = load_state(
             """\
-#############
-#.B.D.......#
-###.#.#C#D###
-  #A#B#C#A#  
-  #########  """
+###############
+#.............#
+###B#A#C#D#E###
+  ###########  """
         )
-        self.assertFalse(state.is_hallway_clear(1, 4))
+        self.assertEqual(5, len(state.rooms))
+        self.assertEqual(46, solve(state).cost)
+
+    def test_unfold(self):
+        state = unfold(State([None] * 11, [["B", "A"], ["C", "D"]]), ["DC", "DB"])
+        self.assertEqual([["B", "D", "D", "A"], ["C", "C", "B", "D"]], state.rooms)
+
+    def test_solution_path(self):
+        with Path(__file__).parent.joinpath("day_23-example.txt").open("r") as f:
+            initial = load_state(f.read())
+        solution = solve(initial)
+        states = solution.states()
+        moves = solution.moves()
+        self.assertEqual(initial, states[0])
+        self.assertEqual(solution.state, states[-1])
+        self.assertEqual(len(states) - 1, len(moves))
+        self.assertEqual(12521, sum(move.cost for move in moves))
+        for before, move, after in zip(states, moves, states[1:]):
+            self.assertEqual(before.cost + move.cost, after.cost)
+            next_keys = [key for key, _ in before.burrow.moves(before.key)]
+            self.assertIn(after.key, next_keys)
+
+    def test_search_stats(self):
+        with Path(__file__).parent.joinpath("day_23-example.txt").open("r") as f:
+            solution = solve(load_state(f.read()))
+        stats = solution.stats
+        self.assertGreaterEqual(stats.pushed, stats.popped)
+        self.assertGreaterEqual(stats.peak_heap, 1)
+        self.assertEqual(stats.popped - stats.stale, stats.expanded)
+        self.assertGreater(stats.expansions_per_second, 0)
+        self.assertEqual(12521, stats.optimal_cost)
+        self.assertLessEqual(stats.root_gap, 0)
+        self.assertGreater(stats.samples, 0)
+        self.assertTrue(stats.admissible)
+
+        stats = SearchStats()
+        with patch.object(Burrow, "heuristic", return_value=10**6):
+            stats.check_heuristics(solution, 4)
+        self.assertFalse(stats.admissible)
+        self.assertEqual(4, stats.samples)
+        self.assertEqual({"burrow"}, {name for name, _, _ in stats.overestimates})
@@ -0,0 +1,160 @@
+import random
+from pathlib import Path
+from unittest import TestCase, skipIf
+from unittest.mock import patch
+
+from day_24 import (
+    ALUProgram,
+    Interval,
+    ModelValidatingALUProgram,
+    analyse,
+    compile_program,
+    fold_constants,
+    model_digits,
+    np,
+    remove_dead_code,
+    solve_model_numbers,
+    split_blocks,
+    z_range,
+)
+
+BINARY_PROGRAM = [
+    "inp w",
+    "add z w",
+    "mod z 2",
+    "div w 2",
+    "add y w",
+    "mod y 2",
+    "div w 2",
+    "add x w",
+    "mod x 2",
+    "div w 2",
+    "mod w 2",
+]
+
+
+def load_input() -> list[str]:
+    with Path(__file__).parent.joinpath("day_24-input.txt").open("r") as f:
+        return f.readlines()
+
+
+class Day24Test(TestCase):
+    def test_compile_binary(self):
+        alu = compile_program(tuple(BINARY_PROGRAM))
+        self.assertEqual((1, 1, 0, 1), alu([13]))
+        self.assertEqual((0, 0, 1, 0), alu([2]))
+
+    def test_compile_cached(self):
+        program = ALUProgram(BINARY_PROGRAM)
+        self.assertIs(program.compile(), compile_program(tuple(BINARY_PROGRAM)))
+
+    def test_compiled_matches_interpreter(self):
+        instructions = load_input()
+        alu = ALUProgram(instructions).compile()
+        rng = random.Random(24)
+        for _ in range(20):
+            digits = [rng.randint(1, 9) for _ in range(14)]
+            program = ALUProgram(instructions, digits)
+            program.run()
+            self.assertEqual(tuple(program[r] for r in "wxyz"), alu(digits))
+
+    def test_model_validation(self):
+        program = ModelValidatingALUProgram(load_input())
+        self.assertTrue(program.is_valid(96299896449997))
+        self.assertTrue(program.is_valid(31162141116841))
+        self.assertFalse(program.is_valid(99999999999999))
+
+        program.set_model_number(96299896449997)
+        program.run()
+        self.assertEqual(0, program["z"])
+        self.assertTrue(program.halted)
+
+    def test_split_blocks(self):
+        blocks = split_blocks(load_input())
+        self.assertEqual(14, len(blocks))
+        self.assertTrue(all(block[0] == "inp w" for block in blocks))
+        with self.assertRaises(ValueError):
+            split_blocks(["inp w", "add x w", "inp w", "add z x"])
+
+    def test_solve_model_numbers(self):
+        self.assertEqual(
+            (96299896449997, 31162141116841), solve_model_numbers(load_input())
+        )
+
+    def test_solve_no_model_number(self):
+        with self.assertRaises(ValueError):
+            solve_model_numbers(["inp w", "add z w"])
+
+    def test_fold_constants(self):
+        folded, z = fold_constants(
+            ["inp w", "add x 10", "eql x w", "eql x 0", "mul y 0", "add y x", "add z w"]
+        )
+        # a digit can never equal 10, so x and y are always 1
+        self.assertEqual(
+            ["inp w", "add z w", "mul x 0", "add x 1", "mul y 0", "add y 1"], folded
+        )
+        self.assertEqual(Interval(1, 9), z)
+
+    def test_remove_dead_code(self):
+        self.assertEqual(
+            ["inp w", "add z w"],
+            remove_dead_code(["inp w", "add x w", "mul y x", "add z w", "mul x 0"]),
+        )
+
+    def test_z_range(self):
+        self.assertEqual(Interval(0, 25), z_range(["mod z 26"], Interval(0, 1000)))
+        self.assertEqual(
+            Interval(27, float("inf")),
+            z_range(["inp w", "mul z 26", "add z w"], Interval(1, float("inf"))),
+        )
+
+    def test_analyse(self):
+        instructions = load_input()
+        analysis = analyse(instructions)
+        self.assertLess(len(analysis.instructions), len(instructions))
+        original = compile_program(tuple(i.strip() for i in instructions))
+        reduced = compile_program(tuple(analysis.instructions))
+        rng = random.Random(20)
+        for _ in range(100):
+            digits = [rng.randint(1, 9) for _ in range(14)]
+            self.assertEqual(original(digits)[3], reduced(digits)[3])
+
+        largest, smallest = solve_model_numbers(instructions)
+        for i, allowed in enumerate(analysis.constraints):
+            self.assertIn(int(str(largest)[i]), allowed)
+            self.assertIn(int(str(smallest)[i]), allowed)
+        self.assertEqual({3, 4, 5, 6, 7, 8, 9}, analysis.constraints[0])
+        self.assertEqual({1, 2, 3, 4, 5, 6, 7}, analysis.constraints[13])
+
+    def test_batch_requires_numpy(self):
+        program = ModelValidatingALUProgram(load_input())
+        with patch("day_24.np", None):
+            with self.assertRaises(RuntimeError):
+                model_digits([96299896449997])
+            with self.assertRaises(RuntimeError):
+                program.evaluate_batch([96299896449997])
+
+
+@skipIf(np is None, "numpy not installed")
+class Day24BatchTest(TestCase):
+    def test_model_digits(self):
+        digits = model_digits([96299896449997, 11111111111111])
+        self.assertEqual((2, 14), digits.shape)
+        self.assertEqual([9, 6, 2, 9, 9, 8, 9, 6, 4, 4, 9, 9, 9, 7], digits[0].tolist())
+
+    def test_batch_matches_compiled(self):
+        instructions = load_input()
+        program = ALUProgram(instructions)
+        alu = program.compile()
+        digits = np.random.default_rng(24).integers(1, 10, size=(500, 14))
+        z = program.run_batch(digits)
+        self.assertEqual([alu(row)[3] for row in digits.tolist()], z.tolist())
+
+    def test_evaluate_batch(self):
+        program = ModelValidatingALUProgram(load_input())
+        z = program.evaluate_batch([96299896449997, 31162141116841, 99999999999999])
+        self.assertEqual([True, True, False], (z == 0).tolist())
+
+    def test_batch_constant_z(self):
+        program = ALUProgram(["inp w", "add z 3"])
+        self.assertEqual([3, 3], program.run_batch([[1], [2]]).tolist())